@@ -0,0 +1,261 @@
+'''Check that the slices of tracefiles do not depend on how they are found. The slices are found
+  * `stream`: while streaming the events of the tracefile (see `tracefile.stream`),
+  * `table`: from an `EventTable` of all events, and
+  * `parallel`: from an `EventTable`, replaying the threads in `JOBS` worker processes, and
+  * `follow`: while following a copy of the tracefile that grows in `FOLLOW_APPENDS` appends (see `tracefile.follow`
+  and `exec_slices.LiveSlices`),
+with and without filtering the events before the first `m5` event. The slices of all modes must be exactly the same.
+
+The parents of the call slices, which are set while replaying, are checked as well against the latest slices of the
+same thread one level up that begin before them (see `exec_slices.parent_mismatches`). Both are known to differ for
+threads whose (approximated) active phases on two CPUs overlap: A phase is taken to end halfway between the last event
+of the thread and the next event on its CPU, and to begin halfway between the previous event on the new CPU and the
+first event of the thread there. If the thread resumes on the new CPU before the old phase is taken to end, a slice of
+the old phase may begin after a slice of the new phase, and bisecting finds the wrong parent. Parent mismatches of such
+threads are only reported, mismatches of any other thread fail the check.
+
+Usage: python check-slices.py [tracefile ...]
+
+Checks `Trace.txt` and a synthetic tracefile if no tracefiles are given. Exits with status 1 if any check fails.'''
+
+from argparse import ArgumentParser
+
+import os
+import random
+import sys
+import tempfile
+
+import flametrace.exec_slices as exec_slices
+import flametrace.tracefile as tracefile
+from flametrace.event_table import NO_ID
+from flametrace.exec_slice import ExecSlice
+from flametrace.exec_slices.exec_stack import ExecStack
+from flametrace.slice_table import SliceTable
+
+import numpy as np
+
+# Number of worker processes of the `parallel` mode
+JOBS = 2
+
+# Number of appends in which the tracefile grows in the `follow` mode, and the size of the blocks they are copied in
+FOLLOW_APPENDS = 3
+FOLLOW_BLOCK_SIZE = 1 << 20
+
+# Seed, number of CPUs, threads and events of the synthetic tracefile
+SYNTHETIC_SEED = 0
+SYNTHETIC_CPUS = 4
+SYNTHETIC_THREADS = 8
+SYNTHETIC_EVENTS = 20000
+
+SYNTHETIC_FUNS = ['schedule', 'pick_next_task', 'enqueue_task_fair', 'dequeue_task_fair', 'do_sys_open', 'vfs_read']
+
+
+####################################################################################################
+# Synthetic tracefile
+####################################################################################################
+
+
+def _line(thread_id, cpu_id, timestamp, type_, info):
+    comm = '<idle>' if thread_id == 0 else '<...>'
+    return f'{comm:>16}-{thread_id:<6} [{cpu_id:03d}]  {timestamp}: {type_}:            {info}'
+
+
+def _thread_name(thread_id, cpu_id):
+    return f'swapper/{cpu_id}' if thread_id == 0 else ('m5' if thread_id == 1000 else f'thread{thread_id}')
+
+
+def write_synthetic(path, seed=SYNTHETIC_SEED):
+    '''Write a synthetic tracefile to `path`, in which threads with random call stacks migrate between CPUs'''
+
+    rnd = random.Random(seed)
+    thread_ids = list(range(1000, 1000 + SYNTHETIC_THREADS))
+    running = {cpu_id: 0 for cpu_id in range(SYNTHETIC_CPUS)}
+    stacks = {thread_id: [] for thread_id in thread_ids}
+
+    lines = [f'cpus={SYNTHETIC_CPUS}']
+    timestamp = 990000000000
+    for _ in range(SYNTHETIC_EVENTS):
+        timestamp += rnd.choice([0, 500, 1000, 1000, 3000, 20000])
+        cpu_id = rnd.randrange(SYNTHETIC_CPUS)
+        thread_id = running[cpu_id]
+
+        if rnd.random() < 0.1:
+            idle = [thread_id for thread_id in thread_ids if thread_id not in running.values()]
+            to_thread_id = rnd.choice(idle + [0])
+            if to_thread_id != thread_id:
+                info = (f'{_thread_name(thread_id, cpu_id)}:{thread_id} [120] TBV ==> '
+                        f'{_thread_name(to_thread_id, cpu_id)}:{to_thread_id} [120]')
+                lines.append(_line(thread_id, cpu_id, timestamp, 'sched_switch', info))
+                running[cpu_id] = to_thread_id
+        elif thread_id != 0:
+            stack = stacks[thread_id]
+            if stack and (len(stack) > 5 or rnd.random() < 0.5):
+                lines.append(_line(thread_id, cpu_id, timestamp, 'ftrace_exit', stack.pop()))
+            else:
+                stack.append(rnd.choice(SYNTHETIC_FUNS))
+                lines.append(_line(thread_id, cpu_id, timestamp, 'ftrace_entry', stack[-1]))
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+####################################################################################################
+# Checks
+####################################################################################################
+
+
+def _reset_ids():
+    # Slice and call IDs are counted across runs, so every mode has to start counting from 0
+    ExecSlice._slice_id = 0
+    ExecStack._call_id = 0
+
+
+def _find_all(path, filter_pre_m5, table, jobs=1):
+    _reset_ids()
+
+    with open(path, 'rb') as tf:
+        if table:
+            return exec_slices.find_all(tracefile.parse_table(tf, filter_pre_m5=filter_pre_m5), jobs=jobs)
+        return exec_slices.find_all(tracefile.stream(tf, filter_pre_m5=filter_pre_m5))
+
+
+def _append(src, dst, size):
+    while size > 0 and (block := src.read(min(size, FOLLOW_BLOCK_SIZE))):
+        dst.write(block)
+        size -= len(block)
+    dst.flush()
+
+
+def _follow_all(path, filter_pre_m5):
+    '''Find the slices of the tracefile at `path` while following a copy of it, which grows in `FOLLOW_APPENDS` appends
+    that do not end at line boundaries, refreshing the slices after each of them like `flametrace.py --follow`'''
+
+    _reset_ids()
+
+    size = os.path.getsize(path)
+    live_slices = exec_slices.LiveSlices()
+    with tempfile.TemporaryDirectory(prefix='flametrace-') as tmp_dir:
+        growing_path = os.path.join(tmp_dir, 'growing.txt')
+        with open(path, 'rb') as src, open(growing_path, 'wb') as growing, open(growing_path, 'rb') as tf:
+            batches = tracefile.follow(tf, filter_pre_m5=filter_pre_m5)
+            trace_events = iter(batches)
+
+            for i in range(FOLLOW_APPENDS):
+                _append(src, growing, (i + 1) * size // FOLLOW_APPENDS - i * size // FOLLOW_APPENDS)
+
+                # Until caught up with the tracefile
+                while batch := next(trace_events):
+                    live_slices.add(batch)
+                live_slices.slices()
+
+            live_slices.add(batches.finish())
+
+    return live_slices.finish()
+
+
+def _differences(slices, other):
+    '''The columns in which the expanded `slices` and `other` differ, comparing strings instead of their IDs'''
+
+    slices = slices.expand()
+    other = other.expand()
+    if len(slices) != len(other):
+        return ['length']
+
+    differences = []
+    for column in SliceTable.COLUMNS:
+        values = getattr(slices, column)
+        other_values = getattr(other, column)
+        if column in ('thread_name_id', 'call_name_id'):
+            values = list(map(slices.string, values.tolist()))
+            other_values = list(map(other.string, other_values.tolist()))
+
+        if not np.array_equal(values, other_values):
+            differences.append(column)
+
+    return differences
+
+
+def _phases(slices):
+    '''The row of the thread slice (i.e. the active phase) that each row of `slices.expand()` belongs to'''
+
+    slices = slices.expand()
+    rows_by_id = dict(zip(slices.id.tolist(), range(len(slices))))
+    parent_rows = np.array([rows_by_id.get(parent, NO_ID) for parent in slices.parent.tolist()], dtype=np.int64)
+
+    phases = np.where(slices.is_thread_slice(), np.arange(len(slices)), parent_rows)
+    while (is_call := (phases != NO_ID) & slices.is_call_slice()[phases]).any():
+        phases[is_call] = parent_rows[phases[is_call]]
+
+    return phases
+
+
+def _overlap_explains(slices, rows, found_rows):
+    '''Which of the given parent mismatches of the `rows` of `slices.expand()`, for which bisecting found the
+    `found_rows`, are explained by overlapping phases: The slice found by bisecting belongs to another phase than the
+    slice itself, and both phases overlap.'''
+
+    expanded = slices.expand()
+    phases = _phases(slices)
+    own = phases[rows]
+    other = np.where(found_rows != NO_ID, phases[found_rows], NO_ID)
+
+    return ((own != NO_ID) & (other != NO_ID) & (own != other)
+            & (expanded.begin[own] < expanded.end[other]) & (expanded.begin[other] < expanded.end[own]))
+
+
+def check(path):
+    '''Check the tracefile at `path`, printing the results. Returns whether all checks passed.'''
+
+    all_ok = True
+    for filter_pre_m5 in (True, False):
+        ok = True
+        name = f'"{path}" ({"with" if filter_pre_m5 else "without"} filtering pre-m5 events)'
+
+        slices = _find_all(path, filter_pre_m5, table=False)
+        for mode, other in (('table', _find_all(path, filter_pre_m5, table=True)),
+                            ('parallel', _find_all(path, filter_pre_m5, table=True, jobs=JOBS)),
+                            ('follow', _follow_all(path, filter_pre_m5))):
+            if differences := _differences(slices, other):
+                print(f'FAIL: {name}: The slices of the {mode} mode differ in: {", ".join(differences)}')
+                ok = False
+
+        mismatches, found = exec_slices.parent_mismatches(slices)
+        if unexplained := np.count_nonzero(~_overlap_explains(slices, mismatches, found)):
+            print(f'FAIL: {name}: {unexplained} call slices have other parents than found by bisecting, which is not '
+                  f'due to overlapping phases')
+            ok = False
+
+        print(f'{"OK" if ok else "FAILED"}: {name}: {len(slices)} slices, {len(mismatches) - unexplained} parent '
+              f'mismatches due to overlapping phases')
+        all_ok &= ok
+
+    return all_ok
+
+
+def _parse_args():
+    parser = ArgumentParser(description=('Check that the slices of tracefiles are the same whether they are found '
+                                         'while streaming, from a table, in parallel or while following the '
+                                         'tracefile, and check the parents of their call slices'))
+
+    parser.add_argument('paths', nargs='*', metavar='tracefile',
+                        help='The tracefile(s) to check (defaults to \'Trace.txt\' and a synthetic tracefile)')
+
+    return parser.parse_args()
+
+
+def main():
+    paths = _parse_args().paths
+
+    with tempfile.TemporaryDirectory(prefix='flametrace-') as tmp_dir:
+        if not paths:
+            paths = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Trace.txt'),
+                     os.path.join(tmp_dir, 'synthetic.txt')]
+            write_synthetic(paths[-1])
+
+        results = [check(path) for path in paths]
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,77 @@
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 
+import flametrace.cache as cache
 import flametrace.config as config
 import flametrace.output.d3 as d3
 import flametrace.exec_slices as exec_slices
+import flametrace.ftb as ftb
 import flametrace.stats as stats
 import flametrace.output.svg as svg
 import flametrace.tracefile as tracefile
+import flametrace.trace_event as trace_event
+import flametrace.trace_index as trace_index
 import flametrace.limit as Limit
 
 import json
 import os
-import pickle
+import re
+import sys
+import time
 
 
 def _setup_parser():
     def limit(x):
-        return Limit.parse(x)
+        return (x.strip(), Limit.parse(x))
 
-    parser = ArgumentParser()
+    def limit_file(path):
+        try:
+            with open(path) as f:
+                lines = [line.strip() for line in f]
+        except OSError as e:
+            raise ArgumentTypeError(f'can\'t open \'{path}\': {e}')
 
-    parser.add_argument('tracefiles', nargs='*', default=['Trace.txt'],
-                        help='The tracefile(s) (defaults to \'Trace.txt\')')
+        limits = []
+        for line in lines:
+            if not line or line.startswith('#'):
+                continue
+            try:
+                limits.append(limit(line))
+            except ValueError:
+                raise ArgumentTypeError(f'invalid limit \'{line}\' in \'{path}\'')
+
+        return limits
 
-    parser.add_argument('--limit', action='store', type=limit)
+    parser = ArgumentParser(epilog=('Use "%(prog)s convert -h" for converting tracefiles into the binary flametrace '
+                                    'format (.ftb)'))
+
+    parser.add_argument('tracefiles', nargs='*', default=['Trace.txt'],
+                        help='The tracefile(s) (defaults to \'Trace.txt\'), can also be .ftb files')
+
+    parser.add_argument('--limit', action='append', type=limit,
+                        help=('limit the outputs to a region of the trace, can be given several times to write the '
+                              'outputs of each region into a subdirectory of its own'))
+    parser.add_argument('--limit-file', action='store', type=limit_file,
+                        help=('file with one --limit per line (ignoring empty lines and lines starting with #), whose '
+                              'outputs are written into a subdirectory per limit just like several --limits'))
     parser.add_argument('--limit-context', action='store', type=float, default=0)
 
+    parser.add_argument('--follow', action='store_true', default=False,
+                        help=('keep reading the tracefile while it is being written and refresh the outputs every '
+                              '--follow-interval seconds, until interrupted (Ctrl-C)'))
+    parser.add_argument('--follow-interval', action='store', type=float, default=10,
+                        help='seconds between two refreshes of the outputs when using --follow (defaults to 10)')
+    parser.add_argument('--index', action='store_true', default=False,
+                        help=('maintain a sparse index next to the tracefile and use it to only parse the region of an '
+                              'absolute or percentage --limit'))
+    parser.add_argument('--jobs', action='store', type=int, default=1,
+                        help='number of processes used to parse the tracefile and build slices (defaults to 1)')
     parser.add_argument('--cpu-ghz', action='store', type=float,
                         help='CPU frequency in GHz (defaults can be configured in flametrace/config.py)')
+    parser.add_argument('--cache-dir', action='store', type=os.path.abspath,
+                        help=('directory in which slices are cached, shared by all tracefiles (defaults can be '
+                              'configured in flametrace/config.py)'))
     parser.add_argument('--no-cache', action='store_true', default=False,
-                        help='Do not cache slices for faster consecutive executions')
+                        help='Do not cache slices for faster consecutive executions, and do not use cached slices')
     parser.add_argument('--no-filter-pre-m5', action='store_true', default=False,
                         help=('do not filter entries from the tracefile that appear before the first entry belonging '
                               'to the m5 thread'))
@@ -57,11 +100,29 @@ def _setup_parser():
     return parser
 
 
+def _setup_convert_parser():
+    parser = ArgumentParser(prog=f'{sys.argv[0]} convert',
+                            description='Convert a tracefile into the binary flametrace format (.ftb)')
+
+    parser.add_argument('tracefile', help='The tracefile to convert')
+    parser.add_argument('-o', '--output', action='store',
+                        help='The .ftb file to write (defaults to the tracefile with its extension replaced by .ftb)')
+    parser.add_argument('--jobs', action='store', type=int, default=1,
+                        help='number of processes used to parse the tracefile (defaults to 1)')
+
+    return parser
+
+
 def _parse_args():
     parser = _setup_parser()
     return parser.parse_args()
 
 
+def _parse_convert_args(argv):
+    parser = _setup_convert_parser()
+    return parser.parse_args(argv)
+
+
 def _results_dir(tracefile):
     cwd = os.getcwd()
     return f'{cwd}/ft-results--{tracefile}'
@@ -76,53 +137,260 @@ def _setup_results_dir(tracefile):
     os.chdir(dir)
 
 
-def _try_load_cached():
-    try:
-        with open('cache', 'rb') as cf:
-            return pickle.load(cf)
-    except FileNotFoundError:
-        return None
+def _event_types():
+    # All outputs are generated from the slices, which are cached regardless of the requested outputs, and limits can
+    # refer to benchmark events. Therefore all outputs currently need the same events.
+    return exec_slices.EVENT_TYPES | tracefile.EVENT_TYPES
 
 
-def _try_save_cached(benchmark_events, slices):
-    try:
-        with open('cache', 'wb') as cf:
-            cache = {'benchmark_events': benchmark_events, 'slices': slices}
-            pickle.dump(cache, cf)
-    except FileExistsError:
-        pass
+def _event_filter(args):
+    return trace_event.EventFilter(_event_types(), config.IGNORED_FUNS)
 
 
-def _compute_slices(tf, args):
-    if not args.reset_cache:
-        print('INFO: No cached slices found')
+def _get_event_table(tf, args, events_key):
+    if not args.reset_cache and (events := cache.load_events(_cache_dir(args), events_key, tf)) is not None:
+        print('INFO: Cached events loaded')
+        return events
 
     print('INFO: Parsing tracefile')
-    events = None
-    events = tracefile.parse(tf, filter_pre_m5=not args.no_filter_pre_m5)
 
-    benchmark_events = tracefile.benchmark_events(events)
+    # The cached events must not depend on any option that only affects finding slices
+    event_filter = trace_event.EventFilter(_event_types())
+    events = tracefile.parse_table(tf, filter_pre_m5=False, jobs=args.jobs, event_filter=event_filter)
+    cache.save_events(_cache_dir(args), events_key, tf, events, config.CACHE_MAX_SIZE, replace=args.reset_cache)
 
-    print('INFO: Building slices')
+    return events
+
+
+def _table_events(events, filter_pre_m5):
+    if filter_pre_m5:
+        events = events.filter_pre_m5()
+
+    return (tracefile.benchmark_events(events.of_types(['trace_info'])), events)
+
+
+def _load_events(tf, args, events_key):
+    filter_pre_m5 = not args.no_filter_pre_m5
+
+    if ftb.is_ftb(tf):
+        print('INFO: Loading binary tracefile')
+        return _table_events(ftb.load(tf.name), filter_pre_m5)
+    if events_key:
+        return _table_events(_get_event_table(tf, args, events_key), filter_pre_m5)
+
+    print('INFO: Parsing tracefile and building slices')
+    if args.jobs > 1:
+        # Replaying the threads in parallel needs all events at once
+        events = tracefile.parse_table(tf, filter_pre_m5=False, jobs=args.jobs, event_filter=_event_filter(args))
+        return _table_events(events, filter_pre_m5)
+
+    benchmark_events = {}
+    events = tracefile.stream(tf, filter_pre_m5=filter_pre_m5, event_filter=_event_filter(args))
+    events = tracefile.with_benchmark_events(events, benchmark_events)
+
+    return (benchmark_events, events)
+
+
+def _try_compute_window_slices(tf, args):
+    limits = [limit for _, limit in _limits(args)]
+    if not (args.index and limits and all(map(exec_slices.is_window_limit, limits))):
+        return None
+    if ftb.is_ftb(tf) or tracefile.is_compressed(tf):
+        print('WARNING: Ignoring --index, as the tracefile is not an uncompressed text tracefile')
+        return None
+
+    filter_pre_m5 = not args.no_filter_pre_m5
+    index = trace_index.load_or_build(tf.name)
+    if not (bounds := trace_index.bounds(index, filter_pre_m5)):
+        return None
+
+    # The region of all limits
+    windows = [exec_slices.limit_window(limit, args.limit_context, bounds) for limit in limits]
+    window = (min(begin for begin, _ in windows), max(end for _, end in windows))
+
+    benchmark_events = {}
+    events = trace_index.stream_window(tf, index, window, filter_pre_m5=filter_pre_m5, event_filter=_event_filter(args))
+    events = tracefile.with_benchmark_events(events, benchmark_events)
+
+    print('INFO: Parsing the --limit region of the tracefile and building slices')
     slices = exec_slices.find_all(events)
 
-    _try_save_cached(benchmark_events, slices)
+    # The slices of the region must not be cached, as they are not all slices
+    return (benchmark_events, slices, bounds)
 
-    return (benchmark_events, slices)
+
+def _compute_slices(tf, args, cache_keys):
+    events_key, slices_key = cache_keys or (None, None)
+    if cache_keys and not args.reset_cache:
+        print('INFO: No cached slices found')
+
+    if window_slices := _try_compute_window_slices(tf, args):
+        return window_slices
+
+    benchmark_events, events = _load_events(tf, args, events_key)
+    print('INFO: Building slices')
+    slices = exec_slices.find_all(events, jobs=args.jobs)
+
+    if slices_key:
+        cache.save_slices(_cache_dir(args), slices_key, tf, benchmark_events, slices, config.CACHE_MAX_SIZE,
+                          replace=args.reset_cache)
+
+    return (benchmark_events, slices, None)
+
+
+def _cache_dir(args):
+    return args.cache_dir or config.CACHE_DIR
+
+
+def _cache_keys(tf, args):
+    """The keys of the cached events and slices of the tracefile (see `cache`), or `None` if they are not cached"""
+
+    # Tracefiles that are not seekable (e.g. pipes) cannot be fingerprinted without consuming them
+    if args.no_cache or not tf.seekable():
+        return None
+
+    events_key = cache.events_key(tf, _event_types())
+    return (events_key, cache.slices_key(events_key, not args.no_filter_pre_m5))
 
 
 def _get_slices(tf, args):
-    cached = None if args.reset_cache else _try_load_cached()
+    cache_keys = _cache_keys(tf, args)
+    cached = None
+    if cache_keys and not args.reset_cache:
+        cached = cache.load_slices(_cache_dir(args), cache_keys[1], tf)
 
     if not cached:
-        return _compute_slices(tf, args)
-    else:
-        print('INFO: Cached slices loaded')
+        return _compute_slices(tf, args, cache_keys)
+
+    print('INFO: Cached slices loaded')
+    benchmark_events, slices = cached
+
+    return (benchmark_events, slices, None)
+
+
+def _limits(args):
+    '''The `(spec, limit)` of each distinct --limit, including the ones of the --limit-file'''
+    return list(dict((args.limit or []) + (args.limit_file or [])).items())
+
+
+# Replacements of the comparisons of `fn` limits in the names of the directories of limits
+LIMIT_DIR_COMPARISONS = {'<=': '_le', '>=': '_ge', '<': '_lt', '>': '_gt'}
+
+
+def _limit_dir(spec):
+    spec = re.sub('|'.join(LIMIT_DIR_COMPARISONS), lambda m: LIMIT_DIR_COMPARISONS[m.group()], spec)
+    return 'limit-' + re.sub(r'[^\w%.-]', '_', spec)
+
+
+def _apply_limit(benchmark_events, slices, bounds, limit, args):
+    print('INFO: Applying limit')
+    slices, windows = exec_slices.limit(slices,
+                                        limit,
+                                        args.limit_context,
+                                        benchmark_events,
+                                        bounds)
+    if not len(slices):
+        raise ValueError('No slices within the limit')
+
+    return (slices, windows)
+
+
+def _write_outputs(benchmark_events, slices, bounds, args):
+    limits = _limits(args)
+    if len(limits) <= 1 and not args.limit_file:
+        windows = None
+        if limits:
+            slices, windows = _apply_limit(benchmark_events, slices, bounds, limits[0][1], args)
+        _write_slices_outputs(slices, windows, args)
+        return
+
+    # Limiting does not modify the slices, so they are loaded only once for all limits
+    for spec, limit in limits:
+        print(f'INFO: Writing outputs of limit "{spec}"')
+        try:
+            limit_slices, windows = _apply_limit(benchmark_events, slices, bounds, limit, args)
+        except ValueError as e:
+            print(f'WARNING: Skipping limit "{spec}": {e}')
+            continue
+
+        limit_dir = _limit_dir(spec)
+        os.makedirs(limit_dir, exist_ok=True)
+
+        cwd = os.getcwd()
+        os.chdir(limit_dir)
+        try:
+            _write_slices_outputs(limit_slices, windows, args)
+        finally:
+            os.chdir(cwd)
+
+
+def _write_slices_outputs(slices, windows, args):
+    # Expand the slices of emulated calls only once for all outputs
+    slices = slices.expand()
 
-        benchmark_events = cached['benchmark_events']
-        slices = cached['slices']
+    if args.stats:
+        print('INFO: Computing stats')
+        stats_ = stats.compute_stats(slices, windows)
+        for stat_group, group_stats in stats_.items():
+            with open(f'stats-{stat_group}.json', 'w') as sf:
+                json.dump(group_stats, sf, indent=4)
 
-    return (benchmark_events, slices)
+    if args.fg_d3:
+        d3.to_json(slices)
+
+    if args.fg_svg:
+        print('INFO: Generating SVG')
+        svg.to_svg(slices, args.fg_svg_width, args.fg_svg_height)
+
+
+def _can_follow(tf, args):
+    if not args.follow:
+        return False
+    if ftb.is_ftb(tf) or tracefile.is_compressed(tf):
+        print('WARNING: Ignoring --follow, as the tracefile is not an uncompressed text tracefile')
+        return False
+
+    return True
+
+
+def _try_refresh(benchmark_events, slices, args):
+    if not len(slices):
+        return
+
+    # The slices so far may not contain what the --limit refers to (yet)
+    try:
+        _write_outputs(benchmark_events, slices, None, args)
+    except ValueError as e:
+        print(f'WARNING: Could not refresh the outputs: {e}')
+
+
+def _follow(tf, args):
+    """Process the tracefile while it is being written, refreshing the outputs from the slices complete so far every
+    `--follow-interval` seconds. Once interrupted, the outputs are written one last time from all slices. As the
+    tracefile is incomplete, the slices are not cached."""
+
+    print('INFO: Following tracefile (press Ctrl-C to stop)')
+    benchmark_events = {}
+    live_slices = exec_slices.LiveSlices()
+    batches = tracefile.follow(tf, filter_pre_m5=not args.no_filter_pre_m5, event_filter=_event_filter(args))
+
+    try:
+        refreshed = time.monotonic()
+        for events in batches:
+            live_slices.add(tracefile.with_benchmark_events(events, benchmark_events))
+
+            if time.monotonic() - refreshed >= args.follow_interval:
+                print('INFO: Refreshing outputs')
+                _try_refresh(benchmark_events, live_slices.slices(), args)
+                refreshed = time.monotonic()
+
+            if not events:
+                time.sleep(config.FOLLOW_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print('INFO: Stopped following tracefile')
+
+    live_slices.add(tracefile.with_benchmark_events(batches.finish(), benchmark_events))
+    _try_refresh(benchmark_events, live_slices.finish(), args)
 
 
 def _run1(tf, tracefile_name, args):
@@ -133,28 +401,11 @@ def _run1(tf, tracefile_name, args):
     _setup_results_dir(tracefile_name)
 
     try:
-        benchmark_events, slices = _get_slices(tf, args)
-
-        if limit := args.limit:
-            print('INFO: Applying limit')
-            slices = exec_slices.limit(slices,
-                                       limit,
-                                       args.limit_context,
-                                       benchmark_events)
-
-        if args.stats:
-            print('INFO: Computing stats')
-            stats_ = stats.compute_stats(slices)
-            for stat_group, group_stats in stats_.items():
-                with open(f'stats-{stat_group}.json', 'w') as sf:
-                    json.dump(group_stats, sf, indent=4)
-
-        if args.fg_d3:
-            d3.to_json(slices)
-
-        if args.fg_svg:
-            print('INFO: Generating SVG')
-            svg.to_svg(slices, args.fg_svg_width, args.fg_svg_height)
+        if _can_follow(tf, args):
+            _follow(tf, args)
+            return
+
+        _write_outputs(*_get_slices(tf, args), args)
     except Exception:
         raise
     finally:
@@ -162,7 +413,7 @@ def _run1(tf, tracefile_name, args):
 
 
 def _try_run1(tracefile, args):
-    with open(tracefile, 'r') as tf:
+    with open(os.path.abspath(tracefile), 'rb') as tf:
         try:
             print(f'INFO: Now processing "{tracefile}"')
             _run1(tf, tracefile, args)
@@ -173,7 +424,19 @@ def _try_run1(tracefile, args):
                 raise e
 
 
+def _convert(args):
+    output = args.output or f'{os.path.splitext(args.tracefile)[0]}.ftb'
+
+    with open(os.path.abspath(args.tracefile), 'rb') as tf:
+        print(f'INFO: Converting "{args.tracefile}" to "{output}"')
+        ftb.save(tracefile.parse_table(tf, filter_pre_m5=False, jobs=args.jobs), output)
+
+
 def main():
+    if sys.argv[1:2] == ['convert']:
+        _convert(_parse_convert_args(sys.argv[2:]))
+        return
+
     args = _parse_args()
 
     if cpu_ghz := args.cpu_ghz:
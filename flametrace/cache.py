@@ -0,0 +1,435 @@
+'''A two-tier cache of the events and slices of tracefiles, keyed by the tracefile's content and the options they depend
+on
+
+The caches are stored in a cache root directory (by default `config.CACHE_DIR`) that is shared by all runs, in two
+tiers of directories:
+  * `events-<key>` caches the parsed and named events of a tracefile (see `events_key`), which only depend on the
+  content of the tracefile and the event types that are parsed. Thus they can be reused after changing any option that
+  only affects finding slices.
+  * `slices-<key>` caches the slices found in these events (see `slices_key`), which also depend on all options that
+  affect finding slices (see `slices_options`).
+
+Thus caches of different variants of a tracefile (e.g. with different `--no-filter-pre-m5`) coexist side by side, a cache is
+never used after any of the options have changed, and copies of a tracefile share the same caches. All keys contain
+`VERSION`, the version of the cache format, which must be increased whenever the cached events or slices change.
+
+The keys only contain a `fingerprint` of the tracefile, which samples a few blocks of it, so that computing them does
+not need to read the whole tracefile. Thus an edit of a tracefile that keeps its size and does not touch the sampled
+blocks, or another tracefile of the same size that happens to share them, leads to the same keys. To never use the
+caches of another content, each cache also records the hash of the whole content of the tracefile it was built from, and
+the identities (device, inode, size and modification time) of the files that are known to have this content. Loading a
+cache for a file with a known identity trusts it (like `trace_index` trusts its `.ftidx` files), any other file (e.g. a
+copy, or the tracefile after it has been written to) is hashed fully once and only uses the cache if the hashes are
+equal, in which case its identity is added to the cache. Of tracefiles with different contents but the same keys, only
+the cache built last is kept. Like all checks based on modification times, this misses edits that restore the
+modification time afterwards.
+
+An events directory contains the events as an `.ftb` file (see `ftb`) named `events.ftb`. A slices directory stores the
+`SliceTable` column-wise, so that loading it is fast: Each column is stored in a `.npy` file named after it, and each
+column of its `EmulatedCallTable` (if any) in a `.npy` file named `emulated-<column>`. In both cases, the columns are
+memory-mapped, so only the columns that are actually needed are read. Both contain the file `header.json` with a JSON
+object with the keys
+  * `version`, `key`: The `VERSION` and the key of the cache
+  * `content`: The hash of the whole content of the tracefile (see `content_hash`)
+  * `identities`: The identities of the files known to have this content (see `identity`), at most `MAX_IDENTITIES`
+
+and, for slices, the keys
+  * `length`: The number of rows of the `SliceTable`
+  * `strings`: Its string table
+  * `has_emulated_calls`: Whether it has an `EmulatedCallTable`
+  * `benchmark_events`: The benchmark events of the tracefile (see `tracefile.benchmark_events`).
+
+The modification time of `header.json` is the time the cache was last used. Once the caches in the cache root exceed
+the maximum size, the least recently used ones are evicted. Several processes can share the cache root: A cache is
+written to a temporary directory that is then renamed, and the cache root is locked (using the file `lock` in it)
+while loading (shared) and while adding and evicting caches (exclusively). As the columns of a cache are memory-mapped
+while loading it, evicting it afterwards does not affect the processes using it.'''
+
+from contextlib import contextmanager
+from flametrace import config
+from flametrace.slice_table import EmulatedCallTable, SliceTable
+from flametrace.util import symbol
+
+import flametrace.ftb as ftb
+import hashlib
+import json
+import numpy as np
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+VERSION = 5
+
+# Prefixes of the directories of both tiers
+EVENTS = 'events'
+SLICES = 'slices'
+
+# Number and size of the blocks of a tracefile that are hashed for its fingerprint
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 1 << 16
+
+# Size of the blocks a tracefile is read in to hash its whole content
+CONTENT_BLOCK_SIZE = 1 << 24
+
+# Maximum number of identities of files that are recorded in the header of a cache
+MAX_IDENTITIES = 16
+
+
+def fingerprint(tracefile):
+    '''A fast fingerprint of the content of the given binary and seekable `tracefile`: A hash of its size and of
+    `FINGERPRINT_BLOCKS` blocks spread evenly across it, or of its whole content if it is not larger than these'''
+
+    pos = tracefile.tell()
+    size = os.fstat(tracefile.fileno()).st_size
+
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    if size <= FINGERPRINT_BLOCKS * FINGERPRINT_BLOCK_SIZE:
+        offsets = [0]
+        block_size = size
+    else:
+        offsets = [i * (size - FINGERPRINT_BLOCK_SIZE) // (FINGERPRINT_BLOCKS - 1) for i in range(FINGERPRINT_BLOCKS)]
+        block_size = FINGERPRINT_BLOCK_SIZE
+
+    for offset in offsets:
+        tracefile.seek(offset)
+        h.update(tracefile.read(block_size))
+
+    tracefile.seek(pos)
+    return h.hexdigest()
+
+
+def identity(tracefile):
+    '''The identity of the file of the given binary `tracefile`: Its device, inode, size and modification time'''
+    st = os.fstat(tracefile.fileno())
+    return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+# The content hashes of the files with the identities used as keys, to only hash each file once per run
+_content_hashes = {}
+
+
+def content_hash(tracefile):
+    '''A hash of the whole content of the given binary and seekable `tracefile`'''
+
+    key = tuple(identity(tracefile))
+    if (digest := _content_hashes.get(key)) is not None:
+        return digest
+
+    pos = tracefile.tell()
+    tracefile.seek(0)
+
+    h = hashlib.blake2b(digest_size=16)
+    while block := tracefile.read(CONTENT_BLOCK_SIZE):
+        h.update(block)
+
+    tracefile.seek(pos)
+    digest = _content_hashes[key] = h.hexdigest()
+    return digest
+
+
+def slices_options(filter_pre_m5):
+    '''The options (including the configuration in `config`) that affect finding the slices in the events of a
+    tracefile'''
+
+    # Slices are kept in picoseconds and only converted into cycles by the outputs, so they do not depend on the CPU
+    # frequency
+    return {'filter_pre_m5': filter_pre_m5,
+            'ignored_funs': sorted(config.IGNORED_FUNS)}
+
+
+def _hash(*values):
+    return hashlib.blake2b(json.dumps([VERSION, *values], sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def events_key(tracefile, event_types):
+    '''The key of the cache of the events of the given binary and seekable `tracefile` (see `fingerprint`), when parsing
+    the `event_types` fully (see `trace_event.EventFilter`) and not filtering any other events'''
+    return _hash(EVENTS, fingerprint(tracefile), sorted(event_types))
+
+
+def slices_key(events_key, filter_pre_m5):
+    '''The key of the cache of the slices found in the events with the given `events_key` with the current
+    `slices_options`'''
+    return _hash(SLICES, events_key, slices_options(filter_pre_m5))
+
+
+def cache_path(root, tier, key):
+    return os.path.join(root, f'{tier}-{key}')
+
+
+@contextmanager
+def _locked(root, shared=False):
+    '''Lock the cache `root` while in this context, `shared` with other processes or exclusively. There is no locking
+    on platforms without `fcntl`.'''
+
+    if fcntl is None:
+        yield
+        return
+
+    with open(os.path.join(root, 'lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _column_path(path, column):
+    return os.path.join(path, f'{column}.npy')
+
+
+def _header_path(path):
+    return os.path.join(path, 'header.json')
+
+
+def _events_path(path):
+    return os.path.join(path, 'events.ftb')
+
+
+def _load_column(path, column):
+    return np.load(_column_path(path, column), mmap_mode='r')
+
+
+def _loader(values):
+    return lambda: values
+
+
+####################################################################################################
+# Loading
+####################################################################################################
+
+
+def _load_header(path, key):
+    try:
+        with open(_header_path(path)) as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        print('WARNING: Ignoring incompatible or corrupt cache')
+        return None
+
+    if header.get('version') != VERSION or header.get('key') != key:
+        print('WARNING: Ignoring incompatible or corrupt cache')
+        return None
+
+    return header
+
+
+def _load_events(path, header):
+    return ftb.load(_events_path(path))
+
+
+def _load_slices(path, header):
+    emulated_calls = None
+    if header['has_emulated_calls']:
+        emulated_calls = EmulatedCallTable({column: _load_column(path, f'emulated-{column}')
+                                            for column in EmulatedCallTable.COLUMNS})
+
+    # Columns are converted lazily (see `SliceTable`), even though they are memory-mapped right away
+    slices = SliceTable({column: _loader(_load_column(path, column)) for column in SliceTable.COLUMNS},
+                        [symbol(s) for s in header['strings']],
+                        emulated_calls)
+
+    return (header['benchmark_events'], slices)
+
+
+def _write_header(path, header):
+    # Replacing the header atomically, as other processes may be reading it
+    tmp_path = f'{_header_path(path)}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp_path, _header_path(path))
+
+
+def _verify(path, header, tracefile):
+    '''Whether the cache at `path` with the given `header` was built from the content of `tracefile`, hashing it fully
+    if its identity is not known yet (see the module documentation)'''
+
+    file_identity = identity(tracefile)
+    if file_identity in header['identities']:
+        return True
+
+    print('INFO: Verifying the content of the tracefile against the cache')
+    if content_hash(tracefile) != header['content']:
+        print('WARNING: Ignoring cache of another tracefile with the same fingerprint')
+        return False
+
+    header['identities'] = (header['identities'] + [file_identity])[-MAX_IDENTITIES:]
+    try:
+        _write_header(path, header)
+    except OSError as e:
+        print(f'WARNING: Could not update cache: {repr(e)}')
+
+    return True
+
+
+def _load(root, tier, key, tracefile, load):
+    if not os.path.isdir(root):
+        return None
+
+    path = cache_path(root, tier, key)
+    with _locked(root, shared=True):
+        if not (header := _load_header(path, key)) or not _verify(path, header, tracefile):
+            return None
+
+        try:
+            cached = load(path, header)
+        except (OSError, ValueError):
+            print('WARNING: Ignoring incompatible or corrupt cache')
+            return None
+
+        # Mark the cache as used
+        os.utime(_header_path(path))
+
+    return cached
+
+
+def load_events(root, key, tracefile):
+    '''Load the cached events (an `EventTable`) of the binary and seekable `tracefile` with the given `key` (see
+    `events_key`) from the cache `root`, or return `None` if there are none'''
+    return _load(root, EVENTS, key, tracefile, _load_events)
+
+
+def load_slices(root, key, tracefile):
+    '''Load the cached `(benchmark_events, slices)` of the binary and seekable `tracefile` with the given `key` (see
+    `slices_key`) from the cache `root`, or return `None` if there are none'''
+    return _load(root, SLICES, key, tracefile, _load_slices)
+
+
+####################################################################################################
+# Saving
+####################################################################################################
+
+
+def _save_events(path, table):
+    ftb.save(table, _events_path(path))
+    return {}
+
+
+def _save_slices(path, cached):
+    benchmark_events, slices = cached
+
+    for column, values in slices.columns().items():
+        np.save(_column_path(path, column), values)
+
+    if (emulated_calls := slices.emulated_calls) is not None:
+        for column in EmulatedCallTable.COLUMNS:
+            np.save(_column_path(path, f'emulated-{column}'), getattr(emulated_calls, column))
+
+    return {'length': len(slices),
+            'strings': slices.strings,
+            'has_emulated_calls': emulated_calls is not None,
+            'benchmark_events': benchmark_events}
+
+
+def _cached_content(path):
+    '''The `content` in the header of the cache at `path`, or `None` if there is no cache or it cannot be read'''
+    try:
+        with open(_header_path(path)) as f:
+            return json.load(f).get('content')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _save(root, tier, key, tracefile, cached, save, max_size, replace):
+    '''Cache `cached` of the binary and seekable `tracefile` in the cache `root` (which is created if it does not
+    exist) using `save(path, cached)`, which writes the files of the cache to the directory `path` and returns the
+    additional keys of its header, and evict the least recently used caches if the caches in it exceed `max_size`
+    bytes. An existing cache with the same key is kept, unless it is of another content or `replace` is set.'''
+
+    path = cache_path(root, tier, key)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    try:
+        os.makedirs(root, exist_ok=True)
+        os.mkdir(tmp_path)
+
+        content = content_hash(tracefile)
+        header = {'version': VERSION, 'key': key, 'content': content, 'identities': [identity(tracefile)]}
+        _write_header(tmp_path, header | save(tmp_path, cached))
+
+        with _locked(root):
+            if replace or _cached_content(path) not in (None, content):
+                # A cache of another content with the same key (see the module documentation) is replaced as well
+                shutil.rmtree(path, ignore_errors=True)
+
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # The cache has been written by another process in the meantime
+                if not os.path.isdir(path):
+                    raise
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+            _evict(root, max_size, keep=path)
+    except OSError as e:
+        print(f'WARNING: Could not cache {tier}: {repr(e)}')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def save_events(root, key, tracefile, table, max_size, replace=False):
+    '''Cache the events `table` (an `EventTable`) of the binary and seekable `tracefile` with the given `key` (see
+    `events_key`) in the cache `root`, evicting the least recently used caches if the caches in it exceed `max_size`
+    bytes. If `replace`, an existing cache with the same key is replaced (e.g. to repair it).'''
+    _save(root, EVENTS, key, tracefile, table, _save_events, max_size, replace)
+
+
+def save_slices(root, key, tracefile, benchmark_events, slices, max_size, replace=False):
+    '''Cache the `benchmark_events` and `slices` of the binary and seekable `tracefile` with the given `key` (see
+    `slices_key`) in the cache `root`, evicting the least recently used caches if the caches in it exceed `max_size`
+    bytes. If `replace`, an existing cache with the same key is replaced (e.g. to repair it).'''
+    _save(root, SLICES, key, tracefile, (benchmark_events, slices), _save_slices, max_size, replace)
+
+
+####################################################################################################
+# Eviction
+####################################################################################################
+
+# Seconds after which temporary cache directories are considered to be left over by crashed processes
+STALE_TMP_SECONDS = 24 * 60 * 60
+
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def _last_used(path):
+    try:
+        return os.stat(_header_path(path)).st_mtime
+    except FileNotFoundError:
+        return 0  # Incomplete caches are evicted first
+
+
+def _is_cache(name):
+    return name.startswith(f'{EVENTS}-') or name.startswith(f'{SLICES}-')
+
+
+def _evict(root, max_size, keep):
+    '''Remove the least recently used caches from the cache `root` (which must be locked exclusively) but `keep` until
+    the caches in it do not exceed `max_size` bytes anymore, as well as stale temporary directories'''
+
+    caches = []
+    for entry in os.scandir(root):
+        if not (entry.is_dir() and _is_cache(entry.name)):
+            continue
+        if '.tmp-' in entry.name:
+            if time.time() - entry.stat().st_mtime > STALE_TMP_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+
+        caches.append((_last_used(entry.path), _dir_size(entry.path), entry.path))
+
+    size = sum(cache_size for _, cache_size, _ in caches)
+    for _, cache_size, path in sorted(caches):
+        if size <= max_size:
+            break
+        if path == keep:
+            continue
+
+        shutil.rmtree(path, ignore_errors=True)
+        size -= cache_size
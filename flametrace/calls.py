@@ -1,63 +1,62 @@
 from flametrace.call import Call
-from flametrace.util import groupby_sorted
+from flametrace.event_table import NO_ID
+from flametrace.slice_table import group_indices
 
+import numpy as np
 
-def _parent(parent, slices_map):
-    if (parent_slice := slices_map.get(parent, None)) and parent_slice.is_call_slice:
-        return parent_slice.call_id
 
+def _parent_call_ids(call_slices):
+    '''The call ID of the parent slice of every call slice, or `NO_ID` if its parent slice is not one of the
+    `call_slices`'''
 
-def _children(call_slices, slices_map):
-    children = set()
-    for slce in call_slices:
-        for child_id in slce.children:
-            if child := slices_map.get(child_id):
-                children.add(child.call_id)
+    order = np.argsort(call_slices.id)
+    ids = call_slices.id[order]
+    if not len(ids):
+        return np.full(0, NO_ID, dtype=np.int64)
 
-    return children
+    parent_rows = order[np.searchsorted(ids, call_slices.parent).clip(max=len(ids) - 1)]
+    is_found = call_slices.id[parent_rows] == call_slices.parent
 
+    return np.where(is_found, call_slices.call_id[parent_rows], NO_ID)
 
-def _from_call_slices(call_id, call_slices, slices_map, parent_ids, children_ids):
-    first = call_slices[0]
-    last = call_slices[-1]
 
-    active_time = sum(map(lambda s: s.duration, call_slices))
-
-    call = Call(active_time,
-                first.begin,
-                last.end,
-                first.is_call_begin and last.is_call_end,
-                call_id,
-                first.call_name,
-                first.thread_uid)
-
-    if parent := _parent(first.parent, slices_map):
-        parent_ids[call_id] = parent
+def all_from_slices(call_slices):
+    '''Build the `Call`s of the `call_slices` (a `SliceTable` of call slices only), ordered by call ID'''
 
-    children_ids[call_id] = []
-    if children := _children(call_slices, slices_map):
-        children_ids[call_id] = list(children)
+    call_ids, first, inverse = np.unique(call_slices.call_id, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    last = np.zeros(len(call_ids), dtype=np.int64)
+    last[inverse] = np.arange(len(inverse))
 
-    return call
+    active_times = np.bincount(inverse, weights=call_slices.durations(), minlength=len(call_ids))
+    is_complete = call_slices.is_call_begin[first] & call_slices.is_call_end[last]
 
-
-def all_from_slices(call_slices):
-    slices_grouped_by_call_id = groupby_sorted(call_slices, key=lambda s: s.call_id)
-    slices_map = {s.id: s for s in call_slices}
+    parent_call_ids = _parent_call_ids(call_slices)
+    has_parent_call = parent_call_ids != NO_ID
+    child_call_ids = call_slices.call_id[has_parent_call]
+    children_ids = {parent_id: set(child_call_ids[rows].tolist())
+                    for parent_id, rows in group_indices(parent_call_ids[has_parent_call]).items()}
 
     calls = {}
-    parent_ids = {}
-    children_ids = {}
-
-    for call_id, call_slices_ in slices_grouped_by_call_id.items():
-        call = _from_call_slices(call_id, call_slices_, slices_map, parent_ids, children_ids)
-        calls[call_id] = call
-
-    for call_id, call in calls.items():
-        if (parent_id := parent_ids.get(call_id)) is not None:
+    for call_id, first_row, last_row, active_time, is_complete_ in zip(call_ids.tolist(),
+                                                                        first.tolist(),
+                                                                        last.tolist(),
+                                                                        active_times.tolist(),
+                                                                        is_complete.tolist()):
+        calls[call_id] = Call(active_time,
+                              call_slices.begin[first_row].item(),
+                              call_slices.end[last_row].item(),
+                              is_complete_,
+                              call_id,
+                              call_slices.string(call_slices.call_name_id[first_row]),
+                              call_slices.thread_uid(first_row))
+
+    for call_id, parent_id in zip(call_ids.tolist(), parent_call_ids[first].tolist()):
+        call = calls[call_id]
+        if parent_id != NO_ID:
             call.parent = calls[parent_id]
 
-        children = map(lambda id: calls[id], children_ids[call_id])
+        children = map(lambda id: calls[id], children_ids.get(call_id, []))
         call.children = list(children)
 
     return calls.values()
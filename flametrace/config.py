@@ -1,3 +1,5 @@
+import os
+
 # Default CPU frequency in GHz
 CPU_GHZ = 2.0
 
@@ -11,6 +13,19 @@ IGNORED_FUNS = ['registerThread', 'unregisterThread',
                 'pool_allocate_message', 'pool_free_message',
                 'pool_read_message', 'pool_write_message']
 
+# Check the parents of all slices, which are found while replaying the threads, against the ones found by searching the
+# slices of each thread and call depth afterwards (slow). Only warns; check-slices.py runs this check (and more) and
+# fails on unexpected mismatches.
+CHECK_PARENTS = False
+
+# Default directory in which the slices of all tracefiles are cached (see flametrace/cache.py), shared by all runs, and
+# the maximum total size of the caches in it in bytes. Once it is exceeded, the least recently used caches are evicted.
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'flametrace')
+CACHE_MAX_SIZE = 10 << 30
+
+# Seconds to wait for new lines when following a tracefile that is being written (see --follow)
+FOLLOW_POLL_INTERVAL = 0.5
+
 # Colors for SVG generation.
 # 'fixed' is a map from thread_uid to hex color
 # 'random' is an array of colors that can be chosen from randomly (must not be empty)
@@ -0,0 +1,293 @@
+'''Storing `TraceEvent`s column-wise in an `EventTable` instead of one object per event'''
+
+from array import array
+
+from flametrace.trace_event import FILTERED, TraceEvent
+from flametrace.util import symbol, thread_id_to_uid, thread_uid_to_id
+
+import numpy as np
+
+# Value of the ID columns if the event has no such property
+NO_ID = -1
+
+
+class EventTable:
+    '''A table of trace events with one NumPy array per column. Strings (call names, thread names and the `info` of
+    other events) are interned into the string table `strings` and stored as IDs into it. The columns are:
+      * `timestamp -> int64`: The timestamp of the event in picoseconds
+      * `cpu_id -> int16`
+      * `thread_id -> int32`: The thread ID as found in the tracefile (0 for all swapper threads)
+      * `type_id -> uint16`: An ID into `types`
+      * `name_id -> int32`: The `call_name` of call events, the `info` of other non-`sched_switch` events
+      * `thread_name_id -> int32`
+      * `switch_to_thread_id -> int32`: The thread ID that a `sched_switch` event switches to
+      * `switch_name_from_id -> int32`, `switch_name_to_id -> int32`: The thread names of a `sched_switch` event
+
+    The ID columns are `NO_ID` where an event does not have the corresponding property. Single rows can be accessed
+    as `TraceEventRow`s, which behave like `TraceEvent`s.'''
+
+    COLUMNS = {'timestamp': np.int64,
+               'cpu_id': np.int16,
+               'thread_id': np.int32,
+               'type_id': np.uint16,
+               'name_id': np.int32,
+               'thread_name_id': np.int32,
+               'switch_to_thread_id': np.int32,
+               'switch_name_from_id': np.int32,
+               'switch_name_to_id': np.int32}
+
+    # The columns holding IDs into `strings`
+    STRING_COLUMNS = ['name_id', 'thread_name_id', 'switch_name_from_id', 'switch_name_to_id']
+
+    def __init__(self, columns, types, strings):
+        '''Construct an `EventTable` from a `dict` of equally long `columns` (see `COLUMNS`), and the lists `types` and
+        `strings` the columns' IDs refer to. Prefer calling `from_events` instead.'''
+
+        for column, dtype in EventTable.COLUMNS.items():
+            setattr(self, column, np.asarray(columns[column], dtype=dtype))
+
+        self.types = types
+        self.strings = strings
+
+    def from_events(trace_events):
+        '''Build an `EventTable` from the (possibly lazy) iterable `trace_events`. The events do not need to be kept
+        alive while building the table.'''
+
+        builder = _EventTableBuilder()
+        for te in trace_events:
+            builder.append(te)
+
+        return builder.build()
+
+    def concatenate(tables):
+        '''Concatenate the `EventTable`s `tables` into one `EventTable`, merging their type and string tables'''
+
+        type_ids = {}
+        string_ids = {}
+        columns = {column: [] for column in EventTable.COLUMNS}
+
+        for table in tables:
+            type_map = np.array([type_ids.setdefault(type_, len(type_ids)) for type_ in table.types], dtype=np.uint16)
+            # The appended `NO_ID` maps `NO_ID` (i.e. the last index) to itself
+            string_map = np.array([string_ids.setdefault(s, len(string_ids)) for s in table.strings] + [NO_ID],
+                                  dtype=np.int32)
+
+            for column, values in table.columns().items():
+                if column == 'type_id':
+                    values = type_map[values]
+                elif column in EventTable.STRING_COLUMNS:
+                    values = string_map[values]
+                columns[column].append(values)
+
+        columns = {column: np.concatenate(values) if values else [] for column, values in columns.items()}
+        return EventTable(columns, list(type_ids), list(string_ids))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, i):
+        return TraceEventRow(self, i)
+
+    def __iter__(self):
+        return (TraceEventRow(self, i) for i in range(len(self)))
+
+    def columns(self):
+        return {column: getattr(self, column) for column in EventTable.COLUMNS}
+
+    def take(self, indices):
+        '''A new `EventTable` of the rows at `indices` (a slice, or an array of indices or a mask), sharing the
+        string table with this one'''
+        return EventTable({column: values[indices] for column, values in self.columns().items()},
+                          self.types,
+                          self.strings)
+
+    def of_types(self, types):
+        '''A new `EventTable` with only the rows of the given `types`'''
+        return self.take(np.isin(self.type_id, self.type_ids(types)))
+
+    def filter_pre_m5(self):
+        '''A new `EventTable` without the rows before the first one belonging to the `m5` thread (see
+        `tracefile.stream`)'''
+
+        is_m5 = np.isin(self.thread_name_id, self.string_ids(['m5']))
+        first = int(np.argmax(is_m5)) if is_m5.any() else len(self)
+        return self.take(slice(first, None))
+
+    ################################################################################################
+
+    def type_ids(self, types):
+        '''The IDs of the given `types`, leaving out types that do not occur in this table'''
+        return [i for i, type_ in enumerate(self.types) if type_ in types]
+
+    def string_ids(self, strings):
+        '''The IDs of the given `strings`, leaving out strings that do not occur in this table'''
+        strings = set(strings)
+        return [i for i, string in enumerate(self.strings) if string in strings]
+
+    def string(self, string_id):
+        return self.strings[string_id] if string_id != NO_ID else None
+
+
+class _EventTableBuilder:
+    '''Collects the columns of an `EventTable` in (compact) `array`s'''
+
+    TYPECODES = {'timestamp': 'q',
+                 'cpu_id': 'h',
+                 'thread_id': 'i',
+                 'type_id': 'H',
+                 'name_id': 'i',
+                 'thread_name_id': 'i',
+                 'switch_to_thread_id': 'i',
+                 'switch_name_from_id': 'i',
+                 'switch_name_to_id': 'i'}
+
+    # The columns that are `NO_ID` for `FILTERED` events
+    DETAIL_COLUMNS = ['name_id', 'switch_to_thread_id', 'switch_name_from_id', 'switch_name_to_id']
+
+    def __init__(self):
+        self._columns = {column: array(typecode) for column, typecode in _EventTableBuilder.TYPECODES.items()}
+        self._type_ids = {}
+        self._string_ids = {}
+
+    def _intern(self, ids, val):
+        if val is None:
+            return NO_ID
+
+        if (id := ids.get(val)) is None:
+            id = ids[val] = len(ids)
+
+        return id
+
+    def append(self, te):
+        type_ = te.type
+        name = switch_name_from = switch_name_to = None
+        switch_to_thread_id = NO_ID
+
+        columns = self._columns
+        columns['timestamp'].append(te.timestamp)
+        columns['cpu_id'].append(te.cpu_id)
+        columns['thread_id'].append(thread_uid_to_id(te.thread_uid))
+        columns['type_id'].append(self._intern(self._type_ids, type_))
+        columns['thread_name_id'].append(self._intern(self._string_ids, te.thread_name))
+
+        if type_ == FILTERED:
+            # Filtered events have no further properties (the most common case when filtering)
+            for column in _EventTableBuilder.DETAIL_COLUMNS:
+                columns[column].append(NO_ID)
+            return
+
+        if type_ == 'sched_switch' and hasattr(te, '_thread_name_to'):
+            sw_info = te.sched_switch_info
+            switch_to_thread_id = int(sw_info['uid_to'])
+            switch_name_from = sw_info['name_from']
+            switch_name_to = sw_info['name_to']
+        elif type_ in CALL_TYPES:
+            name = te.call_name
+        else:
+            name = te.info
+
+        columns['name_id'].append(self._intern(self._string_ids, name))
+        columns['switch_to_thread_id'].append(switch_to_thread_id)
+        columns['switch_name_from_id'].append(self._intern(self._string_ids, switch_name_from))
+        columns['switch_name_to_id'].append(self._intern(self._string_ids, switch_name_to))
+
+    def build(self):
+        return EventTable(self._columns, list(self._type_ids), [symbol(s) for s in self._string_ids])
+
+
+class EventRows:
+    '''A sequence of `TraceEventRow`s of the given `indices` (a NumPy array) into an `EventTable`'''
+
+    def __init__(self, table, indices):
+        self._table = table
+        self._indices = indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, i):
+        return TraceEventRow(self._table, int(self._indices[i]))
+
+    def __iter__(self):
+        return (TraceEventRow(self._table, i) for i in self._indices.tolist())
+
+    @property
+    def indices(self):
+        return self._indices
+
+    @property
+    def table(self):
+        return self._table
+
+
+class TraceEventRow(TraceEvent):
+    '''A thin view of the `i`-th row of an `EventTable` that behaves like the `TraceEvent` it was built from'''
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __repr__(self):
+        return f'TraceEventRow({self._i})'
+
+    @property
+    def i(self):
+        return self._i
+
+    @property
+    def call_name(self):
+        if not self._is_call:
+            raise AttributeError(obj=self, name='call_name')
+        return self._string('name_id')
+
+    @property
+    def cpu_id(self):
+        return int(self._table.cpu_id[self._i])
+
+    @property
+    def info(self):
+        if self._is_call or self._is_sched_switch or self.type == FILTERED:
+            raise AttributeError(obj=self, name='info')
+        return self._string('name_id')
+
+    @property
+    def sched_switch_info(self):
+        if not self._is_sched_switch:
+            raise AttributeError(obj=self, name='sched_switch_info')
+
+        return {'uid_from': self.thread_uid,
+                'name_from': self._string('switch_name_from_id'),
+                'uid_to': str(int(self._table.switch_to_thread_id[self._i])),
+                'name_to': self._string('switch_name_to_id')}
+
+    @property
+    def thread_name(self):
+        return self._string('thread_name_id')
+
+    @property
+    def thread_uid(self):
+        return thread_id_to_uid(int(self._table.thread_id[self._i]), self.cpu_id)
+
+    @property
+    def timestamp(self):
+        return int(self._table.timestamp[self._i])
+
+    @property
+    def type(self):
+        return self._table.types[self._table.type_id[self._i]]
+
+    @property
+    def _is_call(self):
+        return self.type in CALL_TYPES
+
+    @property
+    def _is_sched_switch(self):
+        return self._table.switch_to_thread_id[self._i] != NO_ID
+
+    def _string(self, column):
+        return self._table.string(getattr(self._table, column)[self._i])
+
+
+# Types of events that have a `call_name`
+CALL_TYPES = {'ftrace_entry', 'ftrace_exit', 'sys_enter', 'sys_exit'}
@@ -1,10 +1,15 @@
-from copy import deepcopy
+# Sentinel for slices without children, shared by all of them
+_NO_CHILDREN = ()
 
 
 class ExecSlice:
     """An exec slice represents a slice of execution of a call or an entire thread. Its `type` is
     therefore either `'call'` or `'thread'`. Call slices have the additional properties
     `call_depth`, `call_id` and `call_name`, as well as `is_call_begin` and `is_call_end`."""
+    __slots__ = ('_id', '_type', '_begin', '_end', '_cpu_id', '_thread_uid', '_thread_name',
+                 '_call_depth', '_call_id', '_call_name', '_parent', '_children',
+                 '_is_call_begin', '_is_call_end')
+
     _slice_id = 0
 
     def _next_id():
@@ -17,12 +22,14 @@ class ExecSlice:
                  end=None,
                  parent=None,
                  thread_name=None,
-                 is_call_begin=False, is_call_end=False):
+                 is_call_begin=False, is_call_end=False,
+                 id=None):
         """Create an exec slice with the given properties. Prefer calling the convenience
-        constructors `mk_call_slice` or `mk_thread_slice` instead."""
+        constructors `mk_call_slice` or `mk_thread_slice` instead. If no `id` is given, the slice gets
+        a new unique ID."""
         assert type_ in ['call', 'thread']
 
-        self._id = ExecSlice._next_id()
+        self._id = id if id is not None else ExecSlice._next_id()
 
         # Attributes that must be set initially; begin and cpu_id can also be changed later
         self._type = type_
@@ -36,27 +43,24 @@ class ExecSlice:
             assert (call_id is not None)
             assert call_name
 
-            self._call_depth = call_depth
-            self._call_id = call_id
-            self._call_name = call_name
+        self._call_depth = call_depth
+        self._call_id = call_id
+        self._call_name = call_name
 
         # For thread slices, end must be set initially; for call slices eventually
         assert (type != 'thread') or (end is not None)
         self._end = end
 
         # parent *can* be set initially for every call slice, but *must* be set eventually
-        if type_ == 'call':
-            self._parent = parent
+        self._parent = parent
+        self._children = _NO_CHILDREN
 
         # thread_name can be set initially
-        if thread_name:
-            self._thread_name = thread_name
+        self._thread_name = thread_name or None
 
         # For call slices, these attributes can be set at some point
-        if is_call_begin:
-            self._is_call_begin = is_call_begin
-        if is_call_end:
-            self._is_call_end = is_call_end
+        self._is_call_begin = is_call_begin
+        self._is_call_end = is_call_end
 
     ################################################################################################
 
@@ -64,13 +68,40 @@ class ExecSlice:
         return self.call_depth if self.call_depth is not None else default
 
     def copy(self):
-        return deepcopy(self)
-
-    def new_id(self):
-        self._id = ExecSlice._next_id()
+        """Return a copy of this slice with the same ID. All attributes but `children` are immutable, so they are
+        shared with the copy."""
+
+        clone = ExecSlice.__new__(ExecSlice)
+        clone._id = self._id
+        clone._type = self._type
+        clone._begin = self._begin
+        clone._end = self._end
+        clone._cpu_id = self._cpu_id
+        clone._thread_uid = self._thread_uid
+        clone._thread_name = self._thread_name
+        clone._call_depth = self._call_depth
+        clone._call_id = self._call_id
+        clone._call_name = self._call_name
+        clone._parent = self._parent
+        clone._children = list(self._children) if self._children is not _NO_CHILDREN else _NO_CHILDREN
+        clone._is_call_begin = self._is_call_begin
+        clone._is_call_end = self._is_call_end
+
+        return clone
+
+    def new_id(self, id=None):
+        self._id = id if id is not None else ExecSlice._next_id()
+
+    def shift_ids(self, slice_id_offset, call_id_offset):
+        """Add the given offsets to the ID, the parent (if any) and the call ID (if any) of this slice"""
+        self._id += slice_id_offset
+        if self._parent is not None:
+            self._parent += slice_id_offset
+        if self._call_id is not None:
+            self._call_id += call_id_offset
 
     def __repr__(self):
-        return self.__dict__
+        return str({attr: getattr(self, attr) for attr in ExecSlice.__slots__})
 
     ################################################################################################
     # Properties
@@ -101,32 +132,26 @@ class ExecSlice:
         """Is this call slice the beginning of its `call_id`'s call?"""
         if self.type != 'call':
             raise AttributeError(obj=self, name='_is_call_begin')
-        return getattr(self, '_is_call_begin', False)
+        return self._is_call_begin
 
     @is_call_begin.setter
     def is_call_begin(self, val):
-        if not val and hasattr(self, '_is_call_begin'):
-            delattr(self, '_is_call_begin')
-        else:
-            self._is_call_begin = val
+        self._is_call_begin = val
 
     @property
     def is_call_end(self):
         """Is this call slice the end of its `call_id`'s call?"""
         if self.type != 'call':
             raise AttributeError(obj=self, name='_is_call_end')
-        return getattr(self, '_is_call_end', False)
+        return self._is_call_end
 
     @is_call_end.setter
     def is_call_end(self, val):
-        if not val and hasattr(self, '_is_call_end'):
-            delattr(self, '_is_call_end')
-        else:
-            self._is_call_end = val
+        self._is_call_end = val
 
     @property
     def call_depth(self):
-        return getattr(self, '_call_depth', None)
+        return self._call_depth
 
     @call_depth.setter
     def call_depth(self, val):
@@ -134,23 +159,19 @@ class ExecSlice:
 
     @property
     def call_id(self):
-        return getattr(self, '_call_id', None)
+        return self._call_id
 
     @property
     def call_name(self):
-        return getattr(self, '_call_name', None)
+        return self._call_name
 
     @property
     def children(self):
-        return getattr(self, '_children', [])
+        return self._children
 
     @children.setter
     def children(self, val):
-        if val:
-            setattr(self, '_children', val)
-        else:
-            if hasattr(self, '_children'):
-                delattr(self, '_children')
+        self._children = val or _NO_CHILDREN
 
     @property
     def cpu_id(self):
@@ -170,7 +191,7 @@ class ExecSlice:
 
     @property
     def parent(self):
-        return getattr(self, '_parent', None)
+        return self._parent
 
     @parent.setter
     def parent(self, val):
@@ -178,7 +199,11 @@ class ExecSlice:
 
     @property
     def thread_name(self):
-        return getattr(self, '_thread_name', None)
+        return self._thread_name
+
+    @thread_name.setter
+    def thread_name(self, val):
+        self._thread_name = val
 
     @property
     def thread_uid(self):
@@ -205,17 +230,150 @@ class ExecSlice:
                       end=None,
                       parent=None,
                       thread_name=None,
-                      is_call_begin=False, is_call_end=False):
+                      is_call_begin=False, is_call_end=False,
+                      id=None):
         """Create a call slice with the given properties"""
         return ExecSlice('call', begin, cpu_id, thread_uid,
                          call_depth=call_depth, call_id=call_id, call_name=call_name,
                          end=end,
                          parent=parent,
                          thread_name=thread_name,
-                         is_call_begin=is_call_begin, is_call_end=is_call_end)
+                         is_call_begin=is_call_begin, is_call_end=is_call_end,
+                         id=id)
 
-    def mk_thread_slice(begin, end, cpu_id, thread_uid, thread_name=None):
+    def mk_thread_slice(begin, end, cpu_id, thread_uid, thread_name=None, id=None):
         """Create a thread slice with the given properties"""
         return ExecSlice('thread', begin, cpu_id, thread_uid,
                          end=end,
-                         thread_name=thread_name)
+                         thread_name=thread_name,
+                         id=id)
+
+
+class EmulatedCall:
+    """The slices of a call that has been popped without being pushed (see `ExecStack.pop`) during the previous active
+    phases of its thread, i.e. one call slice per thread slice of `thread_slices[:phases]`, spanning the whole thread
+    slice. Instead of creating all these slices whenever such a call is popped, they are only expanded when needed
+    (see `slices` and `EmulatedCallTable`).
+
+    The slice of phase `p` has the ID `first_id + p`. Its parent is the slice of phase `p` of the `next` emulated call
+    of the same thread, which encloses it, or the thread slice of the phase if there is none. `position` is the index
+    into the call slices of the thread at which the slices would have been created."""
+    __slots__ = ('_first_id', '_thread_slices', '_phases', '_cpu_id', '_thread_uid',
+                 '_call_depth', '_call_id', '_call_name', '_position', '_next')
+
+    def __init__(self, first_id, thread_slices, phases, cpu_id, thread_uid, call_depth, call_id, call_name, position):
+        """Create an emulated call for the first `phases` of the `thread_slices`, which is the list of thread slices
+        of the stack that is still being extended"""
+
+        self._first_id = first_id
+        self._thread_slices = thread_slices
+        self._phases = phases
+        self._cpu_id = cpu_id
+        self._thread_uid = thread_uid
+        self._call_depth = call_depth
+        self._call_id = call_id
+        self._call_name = call_name
+        self._position = position
+        self._next = None
+
+    ################################################################################################
+
+    def slice_id(self, phase):
+        return self._first_id + phase
+
+    def parent(self, phase):
+        return self._next.slice_id(phase) if self._next else self._thread_slices[phase].id
+
+    def slices(self):
+        """Expand the slices of this emulated call"""
+
+        return [ExecSlice.mk_call_slice(thread_slice.begin,
+                                        self._cpu_id,
+                                        self._thread_uid,
+                                        call_depth=self._call_depth,
+                                        call_id=self._call_id,
+                                        call_name=self._call_name,
+                                        end=thread_slice.end,
+                                        parent=self.parent(phase),
+                                        thread_name=thread_slice.thread_name,
+                                        id=self.slice_id(phase))
+                for phase, thread_slice in enumerate(self.thread_slices)]
+
+    def copy(self, thread_slices):
+        """Return a copy of this emulated call for the copies `thread_slices` of the thread slices of its stack, without
+        a `next` emulated call"""
+
+        return EmulatedCall(self._first_id,
+                            thread_slices,
+                            self._phases,
+                            self._cpu_id,
+                            self._thread_uid,
+                            self._call_depth,
+                            self._call_id,
+                            self._call_name,
+                            self._position)
+
+    def shift_ids(self, slice_id_offset, call_id_offset, position_offset):
+        """Add the given offsets to the IDs, the call ID and the position of this emulated call"""
+        self._first_id += slice_id_offset
+        self._call_id += call_id_offset
+        self._position += position_offset
+
+    ################################################################################################
+    # Properties
+    ################################################################################################
+
+    @property
+    def first_id(self):
+        return self._first_id
+
+    @property
+    def thread_slices(self):
+        """The thread slices of the phases this call is emulated for"""
+        return self._thread_slices[:self._phases]
+
+    @property
+    def stack_thread_slices(self):
+        """All thread slices of the stack this call has been emulated in, of which the first `phases` are the ones of
+        this call. The list is shared by all emulated calls of the stack."""
+        return self._thread_slices
+
+    @property
+    def phases(self):
+        return self._phases
+
+    @property
+    def cpu_id(self):
+        return self._cpu_id
+
+    @property
+    def thread_uid(self):
+        return self._thread_uid
+
+    @property
+    def call_depth(self):
+        return self._call_depth
+
+    @call_depth.setter
+    def call_depth(self, val):
+        self._call_depth = val
+
+    @property
+    def call_id(self):
+        return self._call_id
+
+    @property
+    def call_name(self):
+        return self._call_name
+
+    @property
+    def position(self):
+        return self._position
+
+    @property
+    def next(self):
+        return self._next
+
+    @next.setter
+    def next(self, val):
+        self._next = val
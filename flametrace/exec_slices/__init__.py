@@ -1,115 +1,418 @@
 import bisect
+from collections import deque
+from multiprocessing import Pool
+import os
+import tempfile
 
 import flametrace.config as config
 import flametrace.exec_slices.continuous_sequences as cont_seqs
-from flametrace.exec_slices.exec_stack import ExecStack
-from flametrace.util import flatten, groupby_sorted
+import flametrace.ftb as ftb
+from flametrace.event_table import NO_ID, EventRows, EventTable
+from flametrace.exec_slices.exec_stack import ExecStack, number_slices
+from flametrace.slice_table import SliceTable
+from flametrace.util import groupby_sorted, output_units_to_ps
+
+import numpy as np
 
 ####################################################################################################
 # Finding slices
 ####################################################################################################
 
+PUSH_TYPES = ['ftrace_entry', 'syscall_enter']
+POP_TYPES = ['ftrace_exit', 'syscall_exit']
+
+# Event types that are needed for finding slices, see `trace_event.EventFilter`
+EVENT_TYPES = set(PUSH_TYPES + POP_TYPES)
+
+# Stack actions of the rows of an `EventTable`
+NO_ACTION = 0
+PUSH = 1
+POP = 2
+
+
+def _ignored_funs():
+    if not 'ignored_funs' in _ignored_funs.__dict__:
+        _ignored_funs.ignored_funs = set(config.IGNORED_FUNS)
+
+    return _ignored_funs.ignored_funs
+
 
 def _is_ignored(name):
-    if not 'ignored_funs' in _is_ignored.__dict__:
-        _is_ignored.ignored_funs = set(config.IGNORED_FUNS)
+    return name in _ignored_funs()
 
-    return name in _is_ignored.ignored_funs
 
+def _table_columns(table):
+    """Compute the columns of the given `EventTable` that are needed for processing its rows: The stack action of each
+    row (taking ignored functions into account), the call name IDs and the timestamps"""
 
-def _process_1(entry, stack):
-    trace_type = entry.type
-    if trace_type in ['ftrace_entry', 'syscall_enter']:
-        action = stack.push
-    elif trace_type in ['ftrace_exit', 'syscall_exit']:
-        action = stack.pop
-    else:
-        return
+    is_ignored = np.isin(table.name_id, table.string_ids(_ignored_funs()))
+
+    actions = np.full(len(table), NO_ACTION, dtype=np.int8)
+    actions[np.isin(table.type_id, table.type_ids(PUSH_TYPES)) & ~is_ignored] = PUSH
+    actions[np.isin(table.type_id, table.type_ids(POP_TYPES)) & ~is_ignored] = POP
+
+    return (actions, table.name_id, table.timestamp)
+
+
+def _process_rows(rows, stack, table_columns):
+    """Process `EventRows`, only looking at the rows that actually push or pop"""
+
+    actions, name_ids, timestamps = table_columns
+    strings = rows.table.strings
+
+    indices = rows.indices
+    indices = indices[actions[indices] != NO_ACTION]
 
-    call_name = entry.call_name
-    if not _is_ignored(call_name):
-        action(call_name, entry.timestamp)
+    for action, name_id, timestamp in zip(actions[indices].tolist(),
+                                          name_ids[indices].tolist(),
+                                          timestamps[indices].tolist()):
+        if action == PUSH:
+            stack.push(strings[name_id], timestamp)
+        else:
+            stack.pop(strings[name_id], timestamp)
 
 
-def _process(cseq, stack):
+def _process(cseq, stack, table_columns):
     entries = cseq.entries
     cpu_id = cseq.cpu_id
     begin_approx = cseq.begin_approx
     end_approx = cseq.end_approx
 
     stack.resume(begin_approx, cpu_id, cseq.thread_name)
-    for entry in entries:
-        _process_1(entry, stack)
+    _process_rows(entries, stack, table_columns)
     stack.suspend(end_approx)
 
 
-def _find_all_of(thread_uid, cseqs):
+def _find_all_of(thread_uid, cseqs, table_columns):
     cseqs_sorted = sorted(cseqs, key=lambda cs: cs.begin)
 
     stack = ExecStack(thread_uid)
     for csea in cseqs_sorted:
-        _process(csea, stack)
-    return stack.teardown()
+        _process(csea, stack, table_columns)
+    return (*stack.teardown(), stack.id_counts)
+
+
+####################################################################################################
+# Finding slices in a stream of events
+#
+# Instead of first finding all continuous sequences along with their entries, `_SliceBuilder` keeps
+# only the current sequence of each CPU and one `ExecStack` per thread, and replays every event as
+# soon as it is read. As the sequences of a thread must be replayed in the order they begin, the
+# stack operations of a sequence are held back while an earlier sequence of the same thread (on
+# another CPU) has not ended yet. Sequences are ordered by the trace order of their first events,
+# which is the order of their beginning as the timestamps in a tracefile do not decrease.
+####################################################################################################
+
+
+class _Sequence:
+    """A continuous sequence (see `ContinuousSequence`) that is being replayed, without its entries"""
+
+    def __init__(self, thread_uid, cpu_id, thread_name, begin_approx):
+        self.thread_uid = thread_uid
+        self.cpu_id = cpu_id
+        self.thread_name = thread_name
+        self.begin_approx = begin_approx
+        self.end = None
+        self.end_approx = None
+
+        # The stack operations `(action, call_name, timestamp)` that are held back, or `None` once the sequence is
+        # being replayed
+        self.held_back = []
+
+
+class _SliceBuilder:
+    def __init__(self):
+        self._cpu_seqs = {}
+        self._stacks = {}
+        # The sequences of each thread that have not been replayed completely, in the order they began
+        self._thread_seqs = {}
+
+    def add(self, entry):
+        cpu_id = entry.cpu_id
+        thread_uid = entry.thread_uid
+        timestamp = entry.timestamp
+
+        seq = self._cpu_seqs.get(cpu_id)
+        if seq is None or seq.thread_uid != thread_uid:
+            begin_approx = timestamp
+            if seq is not None:
+                begin_approx = (seq.end + timestamp) / 2
+                self._end(seq, begin_approx)
+
+            seq = self._cpu_seqs[cpu_id] = self._begin(thread_uid, cpu_id, entry.thread_name, begin_approx)
+
+        seq.end = timestamp
+
+        trace_type = entry.type
+        if trace_type in PUSH_TYPES:
+            action = PUSH
+        elif trace_type in POP_TYPES:
+            action = POP
+        else:
+            return
+
+        call_name = entry.call_name
+        if _is_ignored(call_name):
+            return
+
+        if seq.held_back is None:
+            _apply(self._stacks[thread_uid], action, call_name, timestamp)
+        else:
+            seq.held_back.append((action, call_name, timestamp))
+
+    def finish(self):
+        """End all sequences and return the slices, emulated calls and ID counts of all threads (see `number_slices`),
+        ordered by `thread_uid`"""
+
+        for seq in self._cpu_seqs.values():
+            self._end(seq, seq.end)
+        self._cpu_seqs = {}
+
+        return [(*stack.teardown(), stack.id_counts) for _, stack in sorted(self._stacks.items())]
+
+    def snapshot(self):
+        """Return copies of the slices, emulated calls and ID counts of all threads so far, like `finish`, but without
+        ending any sequence (see `ExecStack.snapshot`)"""
+
+        return [stack.snapshot() for _, stack in sorted(self._stacks.items())]
+
+    def _begin(self, thread_uid, cpu_id, thread_name, begin_approx):
+        seq = _Sequence(thread_uid, cpu_id, thread_name, begin_approx)
+
+        if not (thread_seqs := self._thread_seqs.setdefault(thread_uid, deque())):
+            if thread_uid not in self._stacks:
+                self._stacks[thread_uid] = ExecStack(thread_uid)
+            self._replay(seq)
+        thread_seqs.append(seq)
+
+        return seq
+
+    def _end(self, seq, end_approx):
+        seq.end_approx = end_approx
+
+        thread_seqs = self._thread_seqs[seq.thread_uid]
+        stack = self._stacks[seq.thread_uid]
+        while thread_seqs and thread_seqs[0].end_approx is not None:
+            stack.suspend(thread_seqs.popleft().end_approx)
+            if thread_seqs:
+                self._replay(thread_seqs[0])
+
+    def _replay(self, seq):
+        stack = self._stacks[seq.thread_uid]
+        stack.resume(seq.begin_approx, seq.cpu_id, seq.thread_name)
+
+        for action, call_name, timestamp in seq.held_back:
+            _apply(stack, action, call_name, timestamp)
+        seq.held_back = None
+
+
+def _apply(stack, action, call_name, timestamp):
+    if action == PUSH:
+        stack.push(call_name, timestamp)
+    else:
+        stack.pop(call_name, timestamp)
+
+
+def _find_all_in_stream(trace_entries):
+    builder = _SliceBuilder()
+    for entry in trace_entries:
+        builder.add(entry)
+
+    return builder.finish()
+
+
+class LiveSlices:
+    """Finding the slices of a trace that is still growing, e.g. while tailing the tracefile of a running simulation
+    (see `tracefile.follow`): New events are replayed as soon as they are `add`ed, and `slices` returns the slices that
+    are complete so far at any time. Once the trace is complete, `finish` returns the same slices as `find_all`.
+
+    Events of a thread before its first `sched_switch` event can only be named once it has been added (see
+    `tracefile.follow`). Thus the slices of threads that are not named are named after the name their threads have in
+    their first `sched_switch` event, just like `tracefile.stream` names their events."""
+
+    def __init__(self):
+        self._builder = _SliceBuilder()
+        self._first_thread_names = {}
+
+    def add(self, trace_entries):
+        for entry in trace_entries:
+            if entry.type == 'sched_switch':
+                sw_info = entry.sched_switch_info
+                self._first_thread_names.setdefault(sw_info['uid_from'], sw_info['name_from'])
+                self._first_thread_names.setdefault(sw_info['uid_to'], sw_info['name_to'])
+
+            self._builder.add(entry)
+
+    def slices(self):
+        """The slices that are complete so far, as a `SliceTable`. Their IDs are not used up, so they can change as
+        slices of new threads are added."""
+        return _to_table(*number_slices(self._named(self._builder.snapshot()), use_ids=False))
+
+    def finish(self):
+        """End all sequences and return all slices as a `SliceTable`"""
+        return _to_table(*number_slices(self._named(self._builder.finish())))
 
+    def _named(self, threads):
+        """Name the slices of the `threads` (see `number_slices`) that are not named after the first names of their
+        threads"""
 
-def _get_find_parent_info(call_slices):
-    """Group `(slices, map(begin, slices))`-pairs by `thread_uid` and then `depth`"""
-    slices_by_thread_uid = groupby_sorted(call_slices, key=lambda s: s.thread_uid)
-    for uid, uid_slices in slices_by_thread_uid.items():
-        slices_by_depth = groupby_sorted(uid_slices, key=lambda s: s.call_depth_or(-1))
-        for depth, depth_slices in slices_by_depth.items():
-            slices_time_sorted = sorted(depth_slices, key=lambda s: s.begin)
-            slices_begins = [s.begin for s in slices_time_sorted]
+        for slices, _, _ in threads:
+            for slce in slices:
+                if slce.thread_name is None and (thread_name := self._first_thread_names.get(slce.thread_uid)):
+                    slce.thread_name = thread_name
 
-            slices_by_depth[depth] = (slices_time_sorted, slices_begins)
+        return threads
 
-        slices_by_thread_uid[uid] = slices_by_depth
 
-    return slices_by_thread_uid
+####################################################################################################
+
+
+def _cseqs_by_thread_uid(table):
+    # Sequences of a thread that begin at the same time are replayed in trace order, just like by `_SliceBuilder`
+    cseqs = sorted(cont_seqs.find_all(table), key=lambda cs: cs.entries.indices[0])
+    return groupby_sorted(cseqs, key=lambda cs: cs.thread_uid)
+
+
+def _find_all_in_table(table):
+    table_columns = _table_columns(table)
+    return [_find_all_of(thread_uid, cseqs, table_columns)
+            for thread_uid, cseqs in _cseqs_by_thread_uid(table).items()]
+
+
+####################################################################################################
+# Replaying threads in parallel
+#
+# The threads of an `EventTable` are independent of each other, so they can be replayed by a pool
+# of worker processes. Instead of pickling the table into every worker, it is written to a
+# temporary `.ftb` file once, which every worker memory-maps (see `ftb.load`), so that all workers
+# share the same pages. The parent finds the continuous sequences of all threads, and only sends
+# the row indices of the sequences of each thread to the workers, which send back only the slices
+# of the thread. As the IDs of the slices are numbered per thread, they do not depend on which
+# worker replays which thread.
+####################################################################################################
+
+# Number of threads sent to a worker at once
+THREADS_PER_TASK = 4
+
+# The memory-mapped table of a worker, and its table columns (see `_table_columns`)
+_worker_table = None
+_worker_table_columns = None
+
+
+class _WorkerSequence:
+    """The properties of a `ContinuousSequence` that are needed for replaying it, with its entries as row indices into
+    the table of a worker"""
+
+    def __init__(self, cseq):
+        self.indices = cseq.entries.indices
+        self.cpu_id = cseq.cpu_id
+        self.thread_name = cseq.thread_name
+        self.begin = cseq.begin
+        self.begin_approx = cseq.begin_approx
+        self.end_approx = cseq.end_approx
 
+    @property
+    def entries(self):
+        return EventRows(_worker_table, self.indices)
 
-def _find_parent(slce, find_parent_info):
-    if not slce.is_call_slice:
-        return
 
-    thread_uid = slce.thread_uid
-    call_depth = slce.call_depth
+def _init_worker(table_path, ignored_funs):
+    global _worker_table, _worker_table_columns
 
-    candidates, begins = find_parent_info[thread_uid][call_depth - 1]
+    config.IGNORED_FUNS = ignored_funs
 
-    i = bisect.bisect_right(begins, slce.begin)
-    slce.parent = candidates[i-1].id
+    _worker_table = ftb.load(table_path)
+    _worker_table_columns = _table_columns(_worker_table)
 
 
-def _find_parents(slices, call_slices):
-    find_parent_info = _get_find_parent_info(slices)
-    for slce in call_slices:
-        _find_parent(slce, find_parent_info)
+def _find_all_of_in_worker(thread_uid_and_seqs):
+    thread_uid, seqs = thread_uid_and_seqs
+    return _find_all_of(thread_uid, seqs, _worker_table_columns)
 
 
-def _find_children(slices, call_slices):
-    slices_by_parent = groupby_sorted(call_slices, key=lambda slce: slce.parent)
-    for slce in slices:
-        slce.children = [other.id for other in slices_by_parent.get(slce.id, [])]
+def _find_all_in_table_parallel(table, jobs):
+    tasks = [(thread_uid, [_WorkerSequence(cseq) for cseq in cseqs])
+             for thread_uid, cseqs in sorted(_cseqs_by_thread_uid(table).items())]
 
+    with tempfile.TemporaryDirectory(prefix='flametrace-') as tmp_dir:
+        table_path = os.path.join(tmp_dir, 'events.ftb')
+        ftb.save(table, table_path)
 
-def _filter_dur0_slices(slices):
-    return [s for s in slices if s.duration > 0]
+        with Pool(jobs, _init_worker, (table_path, config.IGNORED_FUNS)) as pool:
+            return pool.map(_find_all_of_in_worker, tasks, chunksize=THREADS_PER_TASK)
+
+
+def parent_mismatches(slices):
+    """Check the parents of the call slices of the `SliceTable` `slices` (including the slices of emulated calls),
+    which are set while replaying (see `ExecStack`), against the latest slices of the same thread one level up that
+    begin before them. Returns the rows of `slices.expand()` where both differ, and the rows of the slices found by
+    bisecting for them (`NO_ID` if there is none).
+
+    Both are only known to differ if the (approximated) active phases of a thread overlap, i.e. if a thread resumes on
+    one CPU before the midpoint at which its phase on another CPU is taken to end. Then the latter slice may be a slice
+    of the other phase. See `check-slices.py`, which runs this check along with comparing the slices of all modes."""
+
+    slices = slices.expand()
+    thread_keys = slices.thread_keys().tolist()
+    depths = slices.call_depth.tolist()
+    begins = slices.begin.tolist()
+    ids = slices.id.tolist()
+    parents = slices.parent.tolist()
+
+    # The rows of each thread and call depth (`NO_ID` for thread slices), sorted by their begin
+    rows_by_level = {}
+    for i in np.lexsort((slices.begin, slices.call_depth, thread_keys)).tolist():
+        rows_by_level.setdefault((thread_keys[i], depths[i]), []).append(i)
+    begins_by_level = {level: [begins[i] for i in rows] for level, rows in rows_by_level.items()}
+
+    mismatches = []
+    found = []
+    for i in np.flatnonzero(slices.is_call_slice()).tolist():
+        level = (thread_keys[i], depths[i] - 1 if depths[i] > 0 else NO_ID)
+        candidates = rows_by_level.get(level, [])
+        j = bisect.bisect_right(begins_by_level.get(level, []), begins[i]) - 1
+
+        if j < 0 or ids[candidates[j]] != parents[i]:
+            mismatches.append(i)
+            found.append(candidates[j] if j >= 0 else NO_ID)
+
+    return (np.array(mismatches, dtype=np.int64), np.array(found, dtype=np.int64))
+
+
+def _check_parents(slices):
+    mismatches, _ = parent_mismatches(slices)
+    if len(mismatches):
+        print(f'WARNING: {len(mismatches)} slices have other parents than found by bisecting, e.g. slice '
+              f'{slices.expand().id[mismatches[0]]}')
+
+
+def find_all(trace_entries, jobs=1):
+    """Find all slices of the given `trace_entries`, which can be an `EventTable` or any iterable of `TraceEvent`s, and
+    return them as a `SliceTable`. The latter are replayed one by one while iterating over them, so they never need to
+    be held in memory as a whole. The threads of an `EventTable` are replayed by `jobs` worker processes if
+    `jobs > 1`."""
+
+    if isinstance(trace_entries, EventTable):
+        if jobs > 1:
+            threads = _find_all_in_table_parallel(trace_entries, jobs)
+        else:
+            threads = _find_all_in_table(trace_entries)
+    else:
+        threads = _find_all_in_stream(trace_entries)
 
+    return _to_table(*number_slices(threads))
 
-def find_all(trace_entries):
-    cseqs = cont_seqs.find_all(trace_entries)
 
-    cseqs_by_thread_uid = groupby_sorted(cseqs, key=lambda cs: cs.thread_uid).items()
-    slices = flatten([_find_all_of(thread_uid, cont_seqs)
-                     for thread_uid, cont_seqs in cseqs_by_thread_uid])
-    slices = _filter_dur0_slices(slices)
+def _to_table(slices, emulated_calls):
+    """Build the `SliceTable` of the numbered `slices` and `emulated_calls` (see `number_slices`), leaving out empty
+    slices"""
 
-    call_slices = list(filter(lambda s: s.is_call_slice, slices))
-    _find_parents(slices, call_slices)
-    _find_children(slices, call_slices)
+    slices = SliceTable.from_slices(slices, emulated_calls)
+    slices = slices.take(slices.durations() > 0)
+    slices = slices.take(np.argsort(slices.begin, kind='stable'))
 
-    slices.sort(key=lambda s: s.begin)
+    if config.CHECK_PARENTS:
+        _check_parents(slices)
 
     return slices
 
@@ -118,17 +421,29 @@ def find_all(trace_entries):
 ####################################################################################################
 
 
-def _find_first_by(slices, key, val):
-    for s in slices:
-        if key(s) == val:
-            return s
+def _bounds(index, limit_type, limit_value):
+    key = SliceTable.thread_key(str(limit_value)) if limit_type == 'thread' else limit_value
 
+    if not (bounds := index.bounds(limit_type, key)):
+        raise ValueError(f'No slices of the {limit_type} "{limit_value}" to limit to')
+    return bounds
 
-def _get_limit_from_to(slices, limit, limit_context, benchmark_events):
-    slices_rev = sorted(slices, key=lambda s: s.end, reverse=True)
 
-    slices_begin = slices[0].begin
-    slices_end = slices_rev[0].end
+def _first_begin(index, limit_type, limit_value):
+    return _bounds(index, limit_type, limit_value)[0]
+
+
+def _last_end(index, limit_type, limit_value):
+    return _bounds(index, limit_type, limit_value)[1]
+
+
+def _get_limit_from_to(slices, limit, limit_context, benchmark_events, bounds=None):
+    if {limit.get('limit_type_from'), limit.get('limit_type_to')} & {'call', 'slice'}:
+        # Calls and slices can be emulated ones
+        slices = slices.expand()
+
+    index = slices.interval_index() if slices is not None else None
+    slices_begin, slices_end = bounds or index.span()
 
     limit_type_from = limit.get('limit_type_from')
     limit_type_to = limit.get('limit_type_to')
@@ -138,18 +453,19 @@ def _get_limit_from_to(slices, limit, limit_context, benchmark_events):
     limit_from = slices_begin
     limit_to = slices_end
 
+    # Absolute limits are given in the unit of the outputs
     if limit_type_from == 'abs':
-        limit_from = limit_value_from
+        limit_from = output_units_to_ps(limit_value_from)
     if limit_type_to == 'abs':
-        limit_to = limit_value_to
+        limit_to = output_units_to_ps(limit_value_to)
     if limit_type_from == 'benchmark':
         limit_from = benchmark_events['benchmark_start']
     if limit_type_to == 'benchmark':
         limit_to = benchmark_events['benchmark_end']
     if limit_type_from == 'call':
-        limit_from = _find_first_by(slices, lambda s: s.call_id, limit_value_from).begin
+        limit_from = _first_begin(index, 'call', limit_value_from)
     if limit_type_to == 'call':
-        limit_to = _find_first_by(slices_rev, lambda s: s.call_id, limit_value_to).end
+        limit_to = _last_end(index, 'call', limit_value_to)
     if limit_type_from == 'perc' or limit_type_to == 'perc':
         delta = slices_end - slices_begin
 
@@ -162,13 +478,13 @@ def _get_limit_from_to(slices, limit, limit_context, benchmark_events):
     if limit_type_to == 'roi':
         limit_to = benchmark_events['roi_end']
     if limit_type_from == 'slice':
-        limit_from = _find_first_by(slices, lambda s: s.id, limit_value_from).begin
+        limit_from = _first_begin(index, 'slice', limit_value_from)
     if limit_type_to == 'slice':
-        limit_to = _find_first_by(slices_rev, lambda s: s.id, limit_value_to).end
+        limit_to = _last_end(index, 'slice', limit_value_to)
     if limit_type_from == 'thread':
-        limit_from = _find_first_by(slices, lambda s: s.thread_uid, str(limit_value_from)).begin
+        limit_from = _first_begin(index, 'thread', limit_value_from)
     if limit_type_to == 'thread':
-        limit_to = _find_first_by(slices_rev, lambda s: s.thread_uid, str(limit_value_to)).end
+        limit_to = _last_end(index, 'thread', limit_value_to)
 
     limit_from_to_delta = limit_to - limit_from
     limit_from = limit_from - 0.01 * limit_context * limit_from_to_delta
@@ -177,19 +493,73 @@ def _get_limit_from_to(slices, limit, limit_context, benchmark_events):
     return (limit_from, limit_to)
 
 
-def limit(slices, limit, limit_context, benchmark_events):
-    limit_from, limit_to = _get_limit_from_to(slices, limit, limit_context, benchmark_events)
+# Limit types that only depend on the begin and end of all slices
+WINDOW_LIMIT_TYPES = [None, 'abs', 'perc']
+
+
+def is_window_limit(limit):
+    return (limit.get('limit_type_from') in WINDOW_LIMIT_TYPES
+            and limit.get('limit_type_to') in WINDOW_LIMIT_TYPES)
+
+
+def limit_window(limit, limit_context, bounds):
+    """Return the window `(limit_from, limit_to)` that the `limit` (see `is_window_limit`) limits slices to, given the
+    `bounds` `(begin, end)` of all slices"""
+
+    assert is_window_limit(limit)
+
+    return _get_limit_from_to(None, limit, limit_context, {}, bounds)
+
+
+# Comparisons of the durations of `fn` limits
+DURATION_PREDICATES = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+
+def _union(begins, ends):
+    """The disjoint windows `(begins, ends)`, sorted by begin, that the windows `(begins[i], ends[i])` cover"""
+
+    order = np.argsort(begins, kind='stable')
+    begins = begins[order]
+    ends = ends[order]
+
+    # A window is disjoint from the ones before it if it begins after all of them have ended
+    firsts = np.flatnonzero(np.concatenate(([True], begins[1:] > np.maximum.accumulate(ends)[:-1])))
+
+    return (begins[firsts], np.maximum.reduceat(ends, firsts))
+
+
+def _fn_windows(slices, limit, limit_context):
+    """The disjoint windows of all calls of the function of the `fn` `limit` whose durations (in the unit of the
+    outputs) satisfy all of its predicates, each with `limit_context` percent of its duration around it"""
+
+    name = limit['limit_value_from']
+    begins, ends = slices.interval_index().call_intervals(slices.string_id(name))
+
+    durations = ends - begins
+    is_selected = np.ones(len(durations), dtype=bool)
+    for op, value in limit['limit_durations']:
+        is_selected &= DURATION_PREDICATES[op](durations, output_units_to_ps(value))
+
+    if not is_selected.any():
+        raise ValueError(f'No calls of the function "{name}" to limit to')
+
+    context = 0.01 * limit_context * durations[is_selected]
+    return _union(begins[is_selected] - context, ends[is_selected] + context)
+
+
+def limit(slices, limit, limit_context, benchmark_events, bounds=None):
+    """Limit the `slices` (a `SliceTable`) to the region given by `limit`, returning `(limited, windows)`: A new
+    `SliceTable`, and the disjoint windows `(begins, ends)` it is limited to if the region is not a single window
+    (otherwise `None`). If `slices` are only the slices of a part of the trace, `bounds` must be the `(begin, end)` of
+    the slices of the whole trace. An `fn` limit limits the slices to the union of the windows of all matching calls
+    (see `_fn_windows`)."""
+
+    if limit.get('limit_type_from') == 'fn':
+        # Calls can be emulated ones
+        slices = slices.expand()
+        windows = _fn_windows(slices, limit, limit_context)
+        return (slices.windows(*windows), windows)
 
-    slices = [s for s in slices if s.end > limit_from and s.begin < limit_to]
-    for s in slices:
-        is_call_slice = s.type == 'call'
-        if s.begin < limit_from:
-            s.begin = limit_from
-            if is_call_slice:
-                s.is_call_begin = False
-        if s.end > limit_to:
-            s.end = limit_to
-            if is_call_slice:
-                s.is_call_end = False
+    limit_from, limit_to = _get_limit_from_to(slices, limit, limit_context, benchmark_events, bounds)
 
-    return _filter_dur0_slices(slices)
+    return (slices.window(limit_from, limit_to), None)
@@ -9,6 +9,15 @@ class ContinuousSequence:
         if preempted:
             self._preempted = preempted
 
+    def from_entries(entries, preempted=None, preempted_by=None):
+        """Create a continuous sequence from an already complete sequence of `entries`"""
+        cseq = ContinuousSequence(None, preempted)
+        cseq._entries = entries
+        if preempted_by:
+            cseq.preempt_with(preempted_by)
+
+        return cseq
+
     def append(self, entry):
         self._entries.append(entry)
 
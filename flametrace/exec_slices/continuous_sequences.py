@@ -1,5 +1,8 @@
+from flametrace.event_table import EventRows, EventTable
 from flametrace.exec_slices.continuous_sequence import ContinuousSequence
 
+import numpy as np
+
 
 def _process_entry_with_seq(entry, cpu_seq):
     preempted_seq = None
@@ -25,7 +28,51 @@ def _process_entry(entry, cont_seqs, cpu_seqs):
             cont_seqs.append(preempted_seq)
 
 
+def _find_all_in_table(table):
+    """Find all continuous sequences of an `EventTable` without looking at single rows. The sequences are returned in
+    the same order as by `find_all`: In order of their preemption, followed by the sequences that are still running at
+    the end of the trace in order of their CPU's first appearance."""
+
+    n = len(table)
+    if n == 0:
+        return []
+
+    # The rows of each CPU in trace order; within one CPU, thread IDs identify threads uniquely
+    rows = np.argsort(table.cpu_id, kind='stable')
+    cpu_ids = table.cpu_id[rows]
+    thread_ids = table.thread_id[rows]
+
+    is_new_cpu = np.concatenate(([True], cpu_ids[1:] != cpu_ids[:-1]))
+    is_new_seq = is_new_cpu | np.concatenate(([True], thread_ids[1:] != thread_ids[:-1]))
+    cpu_begins = np.maximum.accumulate(np.where(is_new_cpu, np.arange(n), 0))
+
+    seq_begins = np.flatnonzero(is_new_seq)
+    seq_ends = np.append(seq_begins[1:], n)
+    is_preempted = np.append(~is_new_cpu[seq_begins[1:]], False)
+
+    order = np.where(is_preempted,
+                     rows[np.minimum(seq_ends, n - 1)],
+                     n + rows[cpu_begins[seq_begins]])
+
+    cont_seqs = []
+    for i in np.argsort(order, kind='stable').tolist():
+        begin = seq_begins[i]
+        end = seq_ends[i]
+
+        preempted = table[int(rows[begin - 1])] if not is_new_cpu[begin] else None
+        preempted_by = table[int(rows[end])] if is_preempted[i] else None
+
+        cont_seqs.append(ContinuousSequence.from_entries(EventRows(table, rows[begin:end]),
+                                                         preempted,
+                                                         preempted_by))
+
+    return cont_seqs
+
+
 def find_all(trace_entries):
+    if isinstance(trace_entries, EventTable):
+        return _find_all_in_table(trace_entries)
+
     cont_seqs = []
     cpu_seqs = {}
 
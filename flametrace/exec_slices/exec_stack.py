@@ -1,20 +1,35 @@
-from flametrace.exec_slice import ExecSlice
+from itertools import chain
+
+from flametrace.exec_slice import EmulatedCall, ExecSlice
 from flametrace.util import min_key
 
 
-def _normalize_call_depth(call_slices):
+def _normalize_call_depth(call_slices, emulated_calls):
+    # Emulated calls always have a call slice of the same depth as well
     min_depth = min_key(call_slices, key=lambda slce: slce.call_depth, default=0)
     if min_depth:
-        for slce in call_slices:
+        for slce in chain(call_slices, emulated_calls):
             slce.call_depth = slce.call_depth - min_depth
 
 
 class ExecStack:
     """An execution stack for a single thread. i.e. a call stack that also stores information about the begin and end of
     a call. Calls can be pushed onto and popped from the stack, and the stack can be suspended and resumed. Popping also
-    works for calls that have not been pushed, e.g. because tracing was not active when the call begun."""
+    works for calls that have not been pushed, e.g. because tracing was not active when the call begun.
+
+    The IDs and call IDs of the slices are numbered per stack, and only made unique across all stacks afterwards by
+    `number_slices`. Thus the slices of a thread get the same IDs, no matter how (or where) the threads are replayed.
+
+    The `parent` of each call slice is set as soon as the slice is complete: It is the slice of the call below it on
+    the stack, or the thread slice of its active phase for the call at the bottom of the stack. As the thread slice of
+    the current phase is only created when the stack is suspended, and an emulated pop creates a new bottom for all
+    phases so far, the slices at the bottom of each phase are kept until the next emulated pop or until the stack is
+    torn down.
 
-    # Unique ID for each call *across* all threads
+    An emulated pop would create one slice for each previous active phase of the thread. Instead, these slices are
+    recorded as a single `EmulatedCall`, which is only expanded when needed."""
+
+    # Number of call IDs of all slices numbered so far
     _call_id = 0
 
     def __init__(self, thread_uid):
@@ -26,6 +41,17 @@ class ExecStack:
         self._stack = []
         self._thread_uid = thread_uid
 
+        # The calls emulated for the previous active phases, the number of phases they enclose, the slices at the
+        # bottom of the stack during each previous active phase that is not enclosed by them, and during the current one
+        self._emulated_calls = []
+        self._enclosed_phases = 0
+        self._thread_bottom_slices = []
+        self._bottom_slices = []
+
+        # Number of slice IDs and call IDs used by this stack so far
+        self._slice_ids = 0
+        self._call_ids = 0
+
     @property
     def begin(self):
         assert self.is_active
@@ -42,6 +68,11 @@ class ExecStack:
     def thread_uid(self):
         return self._thread_uid
 
+    @property
+    def id_counts(self):
+        """The number of slice IDs and call IDs used by this stack so far"""
+        return (self._slice_ids, self._call_ids)
+
     @property
     def is_active(self):
         return (self._begin is not None) and (self._cpu_id is not None)
@@ -55,6 +86,11 @@ class ExecStack:
     def deactivate(self):
         self._begin = self._cpu_id = None
 
+    def _next_slice_id(self):
+        id = self._slice_ids
+        self._slice_ids += 1
+        return id
+
     def _mk_push_slice(self, call_name, timestamp):
         """Create a slice for a call that has just been pushed onto the stack"""
 
@@ -62,10 +98,11 @@ class ExecStack:
                                        self.cpu_id,
                                        self.thread_uid,
                                        call_depth=self._depth,
-                                       call_id=ExecStack._call_id,
+                                       call_id=self._call_ids,
                                        call_name=call_name,
                                        thread_name=self._thread_name,
-                                       is_call_begin=True)
+                                       is_call_begin=True,
+                                       id=self._next_slice_id())
 
     def push(self, call_name, begin):
         """Push a call with given name and `begin` timestamp onto the stack"""
@@ -76,26 +113,33 @@ class ExecStack:
         self._stack.append(new_slice)
 
         self._depth += 1
-        ExecStack._call_id += 1
-
-    def _emulate_prev_pop_slice(self, call_name, thread_slice):
-        """Emulate the slice that corresponds to the call during the given previous active phase of the thread"""
-
-        return ExecSlice.mk_call_slice(thread_slice.begin,
-                                       self.cpu_id,
-                                       self.thread_uid,
-                                       call_depth=self._depth,
-                                       call_id=ExecStack._call_id,
-                                       call_name=call_name,
-                                       end=thread_slice.end,
-                                       thread_name=thread_slice.thread_name)
-
-    def _emulate_prev_pop_slices(self, function_name):
-        """Emulate slices that correspond to the call during previously active phases of the thread"""
-
-        return [self._emulate_prev_pop_slice(function_name, thread_slice)
-                for thread_slice
-                in self._thread_slices]
+        self._call_ids += 1
+
+    def _emulate_prev_pop(self, call_name):
+        """Emulate the slices that correspond to the call during the previous active phases of the thread"""
+
+        phases = len(self._thread_slices)
+        emulated_call = EmulatedCall(self._slice_ids,
+                                     self._thread_slices,
+                                     phases,
+                                     self.cpu_id,
+                                     self.thread_uid,
+                                     call_depth=self._depth,
+                                     call_id=self._call_ids,
+                                     call_name=call_name,
+                                     position=len(self._call_slices))
+        self._slice_ids += phases
+
+        # The emulated call encloses all slices of this thread so far
+        if self._emulated_calls:
+            self._emulated_calls[-1].next = emulated_call
+        for phase, bottom_slices in enumerate(self._thread_bottom_slices, self._enclosed_phases):
+            for slce in bottom_slices:
+                slce.parent = emulated_call.slice_id(phase)
+
+        self._emulated_calls.append(emulated_call)
+        self._enclosed_phases = phases
+        self._thread_bottom_slices = []
 
     def _emulate_pop_slice(self, call_name, timestamp):
         """Emulate the slice that corresponds to the call during the currently active phase of the thread"""
@@ -104,11 +148,20 @@ class ExecStack:
                                        self.cpu_id,
                                        self.thread_uid,
                                        call_depth=self._depth,
-                                       call_id=ExecStack._call_id,
+                                       call_id=self._call_ids,
                                        call_name=call_name,
                                        end=timestamp,
                                        thread_name=self._thread_name,
-                                       is_call_end=True)
+                                       is_call_end=True,
+                                       id=self._next_slice_id())
+
+    def _set_parent(self, slce, depth):
+        """Set the parent of the slice of the call at the given `depth` of the stack (an index into it)"""
+
+        if depth > 0:
+            slce.parent = self._stack[depth - 1].id
+        else:
+            self._bottom_slices.append(slce)
 
     def _pop(self, timestamp):
         """Set some more properties for a slice that has previously been pushed and return it"""
@@ -116,6 +169,7 @@ class ExecStack:
         slce = self._stack.pop()
         slce.end = timestamp
         slce.is_call_end = True
+        self._set_parent(slce, len(self._stack))
         self._depth -= 1
         return slce
 
@@ -123,11 +177,14 @@ class ExecStack:
         """"Emulate" a pop for a call that has not been pushed before"""
 
         self._depth -= 1
-        prev_slices = self._emulate_prev_pop_slices(function_name)
+        self._emulate_prev_pop(function_name)
         slce = self._emulate_pop_slice(function_name, timestamp)
 
-        prev_slices.append(slce)
-        return prev_slices
+        for bottom_slice in self._bottom_slices:
+            bottom_slice.parent = slce.id
+        self._bottom_slices = [slce]
+
+        return slce
 
     def pop(self, call_name, end):
         """Pop a call with given name and `end` timestamp from the stack"""
@@ -139,10 +196,10 @@ class ExecStack:
             self._call_slices.append(popped_slice)
         # There is a pop but nothing in the stack => "Emulate" a pop
         else:
-            popped_slices = self._emulate_pop(call_name, end)
-            self._call_slices.extend(popped_slices)
+            popped_slice = self._emulate_pop(call_name, end)
+            self._call_slices.append(popped_slice)
 
-            ExecStack._call_id += 1
+            self._call_ids += 1
 
     def _suspend_slice(self, slce, timestamp):
         suspended_slice = slce.copy()
@@ -150,7 +207,11 @@ class ExecStack:
         return suspended_slice
 
     def _suspend_slices(self, timestamp):
-        return [self._suspend_slice(slce, timestamp) for slce in self._stack]
+        suspended_slices = [self._suspend_slice(slce, timestamp) for slce in self._stack]
+        for depth, slce in enumerate(suspended_slices):
+            self._set_parent(slce, depth)
+
+        return suspended_slices
 
     def suspend(self, timestamp):
         """Suspend the stack at the given `timestamp` when this thread stopped executing, e.g. because a new thread has
@@ -162,12 +223,18 @@ class ExecStack:
                                                  timestamp,
                                                  self.cpu_id,
                                                  self.thread_uid,
-                                                 self._thread_name)
+                                                 self._thread_name,
+                                                 id=self._next_slice_id())
         self._thread_slices.append(thread_slice)
 
         new_call_slices = self._suspend_slices(timestamp)
         self._call_slices.extend(new_call_slices)
 
+        for slce in self._bottom_slices:
+            slce.parent = thread_slice.id
+        self._thread_bottom_slices.append(self._bottom_slices)
+        self._bottom_slices = []
+
         self.deactivate()
 
     def resume(self, timestamp, cpu_id, thread_name):
@@ -181,20 +248,73 @@ class ExecStack:
         self._thread_name = thread_name
 
         for slce in self._stack:
-            slce.new_id()
+            slce.new_id(self._next_slice_id())
             slce.begin = timestamp
             slce.cpu_id = cpu_id
             slce.is_call_begin = False
 
     def teardown(self):
-        """Teardown this stack once a thread has stopped executing"""
-        _normalize_call_depth(self._call_slices)
+        """Teardown this stack once a thread has stopped executing, returning its slices and its `EmulatedCall`s"""
+        _normalize_call_depth(self._call_slices, self._emulated_calls)
 
         slices = self._call_slices
         slices.extend(self._thread_slices)
+        emulated_calls = self._emulated_calls
 
         self._call_slices = []
         self._thread_slices = []
+        self._emulated_calls = []
+        self._enclosed_phases = 0
+        self._thread_bottom_slices = []
+        self._bottom_slices = []
         self.deactivate()
 
-        return slices
+        return (slices, emulated_calls)
+
+    def snapshot(self):
+        """Return copies of the slices and `EmulatedCall`s of this stack so far (see `teardown`), along with its
+        `id_counts`, without tearing it down. The slices of the calls that are still on the stack and of the current
+        active phase are missing, as they are not complete yet."""
+
+        thread_slices = [slce.copy() for slce in self._thread_slices]
+        call_slices = [slce.copy() for slce in self._call_slices]
+
+        emulated_calls = [emulated_call.copy(thread_slices) for emulated_call in self._emulated_calls]
+        for emulated_call, next_emulated_call in zip(emulated_calls, emulated_calls[1:]):
+            emulated_call.next = next_emulated_call
+
+        _normalize_call_depth(call_slices, emulated_calls)
+
+        return (call_slices + thread_slices, emulated_calls, self.id_counts)
+
+
+def number_slices(threads, use_ids=True):
+    """Make the IDs and call IDs of the slices of the given `threads`, a list of `(slices, emulated_calls, id_counts)`
+    triples of torn down `ExecStack`s, unique across all threads: The IDs of each thread are mapped to consecutive
+    ranges in the order of `threads`. Returns the slices and the emulated calls of all threads, where the positions of
+    the emulated calls are indices into the slices of all threads.
+
+    If not `use_ids`, the IDs are not used up, i.e. the next slices get the same IDs again (e.g. for snapshots, see
+    `ExecStack.snapshot`)."""
+
+    slice_id = ExecSlice._slice_id
+    call_id = ExecStack._call_id
+
+    all_slices = []
+    all_emulated_calls = []
+    for slices, emulated_calls, (slice_id_count, call_id_count) in threads:
+        for slce in slices:
+            slce.shift_ids(slice_id, call_id)
+        for emulated_call in emulated_calls:
+            emulated_call.shift_ids(slice_id, call_id, len(all_slices))
+
+        slice_id += slice_id_count
+        call_id += call_id_count
+        all_slices.extend(slices)
+        all_emulated_calls.extend(emulated_calls)
+
+    if use_ids:
+        ExecSlice._slice_id = slice_id
+        ExecStack._call_id = call_id
+
+    return (all_slices, all_emulated_calls)
@@ -0,0 +1,93 @@
+'''Reading and writing `EventTable`s in the compact binary flametrace trace format (`.ftb`)
+
+An `.ftb` file starts with `MAGIC`, followed by the length of the header as a little-endian `uint64` and the header
+itself, which is a JSON object with the keys
+  * `version`: The `VERSION` of the format the file was written with
+  * `length`: The number of events
+  * `types`, `strings`: The type and string tables of the `EventTable`
+  * `columns`: A list of `{'name', 'dtype', 'offset'}` objects describing the columns.
+
+The columns follow the header as fixed-width little-endian arrays, each starting at a multiple of `ALIGNMENT` bytes.
+Their `offset`s are relative to the end of the header (rounded up to `ALIGNMENT` bytes), so that they can be
+memory-mapped directly.'''
+
+from flametrace.event_table import EventTable
+from flametrace.util import symbol
+
+import json
+import numpy as np
+
+MAGIC = b'FLMTRACE'
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def is_ftb(tracefile):
+    '''Is the given binary `tracefile` an `.ftb` file? Does not change the position in `tracefile`.'''
+
+    if hasattr(tracefile, 'peek'):
+        return tracefile.peek(len(MAGIC)).startswith(MAGIC)
+
+    pos = tracefile.tell()
+    magic = tracefile.read(len(MAGIC))
+    tracefile.seek(pos)
+    return magic == MAGIC
+
+
+def save(table, path):
+    '''Write the `EventTable` `table` to the file at `path`'''
+
+    columns = []
+    offset = 0
+    for name, values in table.columns().items():
+        dtype = values.dtype.newbyteorder('<')
+        columns.append({'name': name, 'dtype': dtype.str, 'offset': offset})
+        offset = _align(offset + dtype.itemsize * len(table))
+
+    header = json.dumps({'version': VERSION,
+                         'length': len(table),
+                         'types': table.types,
+                         'strings': table.strings,
+                         'columns': columns}).encode()
+    data_offset = _align(len(MAGIC) + 8 + len(header))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array(len(header), dtype='<u8').tobytes())
+        f.write(header)
+
+        for column in columns:
+            f.seek(data_offset + column['offset'])
+            f.write(getattr(table, column['name']).astype(column['dtype']).tobytes())
+
+
+def load(path):
+    '''Load the `EventTable` stored in the file at `path`. The columns are memory-mapped, so loading does not read
+    them.'''
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'"{path}" is not an .ftb file')
+
+        header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+        header = json.loads(f.read(header_length))
+
+    if (version := header['version']) != VERSION:
+        raise ValueError(f'"{path}" has .ftb version {version}, but only version {VERSION} is supported')
+
+    length = header['length']
+    data_offset = _align(len(MAGIC) + 8 + header_length)
+
+    columns = {}
+    for column in header['columns']:
+        if length == 0:
+            columns[column['name']] = np.empty(0, dtype=column['dtype'])
+        else:
+            columns[column['name']] = np.memmap(path, dtype=column['dtype'], mode='r',
+                                                offset=data_offset + column['offset'], shape=(length,))
+
+    return EventTable(columns, header['types'], [symbol(s) for s in header['strings']])
@@ -1,5 +1,22 @@
 import re
 
+# Example: "fn:pick_next_task_fair>=1000<5000"
+FN_REGEX = r'fn:(?P<name>[^:<>=\s](?:[^:<>=]*[^:<>=\s])?)(?P<durations>(?:[<>]=?\d+(?:\.\d+)?)*)'
+DURATION_REGEX = r'(?P<op>[<>]=?)(?P<value>\d+(?:\.\d+)?)'
+
+
+def _parse_fn(lim_str):
+    if not (m := re.fullmatch(FN_REGEX, lim_str)):
+        raise ValueError()
+
+    durations = [(d.group('op'), float(d.group('value'))) for d in re.finditer(DURATION_REGEX, m.group('durations'))]
+
+    return {'limit_type_from': 'fn',
+            'limit_type_to': 'fn',
+            'limit_value_from': m.group('name'),
+            'limit_value_to': m.group('name'),
+            'limit_durations': durations}
+
 
 def _parse_1(lim_str):
     if lim_str in ['benchmark', 'roi']:
@@ -28,6 +45,9 @@ def _parse_1(lim_str):
 
 def parse(lims_str):
     lims_str = lims_str.strip()
+    if lims_str.startswith('fn:'):
+        return _parse_fn(lims_str)
+
     lims_strs = lims_str.split(':', 1)
 
     if len(lims_strs) == 1:
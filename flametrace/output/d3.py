@@ -1,78 +1,90 @@
 import json
-from flametrace import exec_slices
-from flametrace.util import groupby_sorted, max_key, min_key, ps_to_cycles
+from flametrace.event_table import NO_ID
+from flametrace.slice_table import group_indices
+from flametrace.util import output_number, ps_to_cycles, ps_to_output_units
 
 
 def _slice_seq_to_json(slice_seq, slices, begin, slices_by_parent):
     curr_timestamp = begin
 
     json_seq = []
-    for slce in slice_seq:
-        delta = slce.begin - curr_timestamp
+    for i in slice_seq:
+        slice_begin = slices['begin'][i]
+        delta = slice_begin - curr_timestamp
 
         if delta > 0:
             json_seq.append({'name': 'HIDEME',
                              'cycles': ps_to_cycles(delta),
-                             'value': delta})
-        curr_timestamp = slce.begin
+                             'value': output_number(ps_to_output_units(delta))})
+        curr_timestamp = slice_begin
 
-        slce_json = _slice_to_json(slce, slices, slices_by_parent)
+        slce_json = _slice_to_json(i, slices, slices_by_parent)
         json_seq.append(slce_json)
 
-        curr_timestamp = slce.end
+        curr_timestamp = slices['end'][i]
 
     return json_seq
 
 
-def _slice_children_to_json(slce, slices, slices_by_parent):
-    children = slices_by_parent.get(slce.id, [])
-    return _slice_seq_to_json(children, slices, slce.begin, slices_by_parent)
+def _slice_children_to_json(i, slices, slices_by_parent):
+    children = slices_by_parent.get(slices['id'][i], [])
+    return _slice_seq_to_json(children, slices, slices['begin'][i], slices_by_parent)
 
 
-def _slice_to_json(slce, slices, slices_py_parent):
-    call_name = slce.call_name
-    call_name = f': {call_name}' if call_name else ''
-
-    thread_uid = slce.thread_uid
-    name = f'{thread_uid}{call_name}'
+def _slice_to_json(i, slices, slices_by_parent):
+    children = _slice_children_to_json(i, slices, slices_by_parent)
 
-    children = _slice_children_to_json(slce, slices, slices_py_parent)
-
-    duration = slce.duration
-    return {'name': name,
-            'value': duration,
+    duration = slices['end'][i] - slices['begin'][i]
+    return {'name': slices['name'][i],
+            'value': output_number(ps_to_output_units(duration)),
             'cycles': ps_to_cycles(duration),
-            'thread_uid': thread_uid,
+            'thread_uid': slices['thread_uid'][i],
             'children': children}
 
 
-def _parent_or_m1(slce):
-    if (parent := slce.parent) is not None:
-        return parent
+def _slice_name(thread_uid, call_name):
+    call_name = f': {call_name}' if call_name else ''
+    return f'{thread_uid}{call_name}'
+
+
+def _json_columns(slices):
+    '''The columns of the `SliceTable` `slices` that are needed for the JSON, as lists'''
 
-    return -1
+    thread_uids = [slices.thread_uid(i) for i in range(len(slices))]
+    call_names = map(slices.string, slices.call_name_id.tolist())
 
+    return {'id': slices.id.tolist(),
+            'begin': slices.begin.tolist(),
+            'end': slices.end.tolist(),
+            'name': list(map(_slice_name, thread_uids, call_names)),
+            'thread_uid': thread_uids}
 
-def _cpu_slices_to_json(cpu_id, cpu_slices, trace_begin, trace_duration):
-    slices_by_parent = groupby_sorted(cpu_slices, key=_parent_or_m1)
 
-    top_level_slices = slices_by_parent[-1]
-    json_children = _slice_seq_to_json(top_level_slices, cpu_slices, trace_begin, slices_by_parent)
+def _cpu_slices_to_json(cpu_id, cpu_rows, slices, parents, trace_begin, trace_duration):
+    slices_by_parent = {parent: cpu_rows[rows].tolist() for parent, rows in group_indices(parents[cpu_rows]).items()}
+
+    top_level_slices = slices_by_parent[NO_ID]
+    json_children = _slice_seq_to_json(top_level_slices, slices, trace_begin, slices_by_parent)
 
     return {'name': f'core{cpu_id}',
-            'value': trace_duration,
+            'value': output_number(ps_to_output_units(trace_duration)),
             'cycles': ps_to_cycles(trace_duration),
             'children': json_children}
 
 
 def to_json(slices, prefix='d3-trace-cpu'):
-    slices_by_cpu = groupby_sorted(slices, lambda s: s.cpu_id)
+    """Write the D3 flamegraph JSON of each CPU of the `slices` (a `SliceTable`). The `value` of each node is its
+    duration in the unit of the outputs, and `cycles` its duration in cycles."""
+
+    slices = slices.expand()
+    slices_by_cpu = group_indices(slices.cpu_id)
 
-    begin = min_key(slices, lambda s: s.begin)
-    end = max_key(slices, lambda s: s.end)
+    begin = slices.begin.min().item()
+    end = slices.end.max().item()
 
-    for cpu_id, cpu_slices in slices_by_cpu.items():
-        cpu_json = _cpu_slices_to_json(cpu_id, cpu_slices, begin, end - begin)
+    columns = _json_columns(slices)
+    for cpu_id, cpu_rows in slices_by_cpu.items():
+        cpu_json = _cpu_slices_to_json(cpu_id, cpu_rows, columns, slices.parent, begin, end - begin)
 
         with open(f'{prefix}-{cpu_id}.json', 'w') as f:
             json.dump(cpu_json, f)
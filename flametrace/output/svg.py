@@ -2,9 +2,12 @@ from math import floor, log
 
 import drawSvg as draw_svg
 
-from flametrace.util import groupby_sorted, max_key, min_key, thread_uid_to_id
+from flametrace.slice_table import group_indices
+from flametrace.util import output_number, thread_uid_to_id
 import flametrace.config as config
 
+import numpy as np
+
 MAJOR_HEIGHT = 15
 TEXT_HEIGHT = 60
 Y_OFFSET = MAJOR_HEIGHT + TEXT_HEIGHT + 15
@@ -56,9 +59,9 @@ def _slice_info(slce):
     else:
         thread_name_str = ''
 
-    infos = [f'Begin: {slce.begin}',
-             f'End: {slce.end}',
-             f'Duration: {slce.duration}']
+    infos = [f'Begin: {output_number(slce.begin)}',
+             f'End: {output_number(slce.end)}',
+             f'Duration: {output_number(slce.duration)}']
 
     title_str = f'{slice_type_str} ({id}) - {call_name_str}{thread_uid}{thread_name_str} - CPU {slce.cpu_id}'
     infos_str = '\n'.join([f'  {info}' for info in [*infos, '', *type_infos]])
@@ -66,16 +69,8 @@ def _slice_info(slce):
     return '\n'.join([title_str, infos_str])
 
 
-def exec_slice_to_rectangle(slce, trace_begin, slice_x_factor, y, slice_height):
-    thread_uid = slce.thread_uid
-
-    slice_begin = slce.begin
-    slice_end = slce.end
-    slice_duration = slice_end - slice_begin
-
-    x = (slice_begin - trace_begin) * slice_x_factor
-    width = (slice_duration) * slice_x_factor
-    fill = _thread_uid_to_fill(thread_uid)
+def exec_slice_to_rectangle(slce, x, y, width, slice_height):
+    fill = _thread_uid_to_fill(slce.thread_uid)
 
     slice_info = _slice_info(slce)
 
@@ -86,6 +81,14 @@ def exec_slice_to_rectangle(slce, trace_begin, slice_x_factor, y, slice_height):
     return r
 
 
+def _slices_to_rectangles(svg, slices, rows, trace_begin, x_factor, ys, slice_height):
+    xs = (slices.begin[rows] - trace_begin) * x_factor
+    widths = slices.durations()[rows] * x_factor
+
+    for i, x, y, width in zip(rows.tolist(), xs.tolist(), ys.tolist(), widths.tolist()):
+        svg.append(exec_slice_to_rectangle(slices[i], x, y, width, slice_height))
+
+
 def _tick_type_selector(i, min_step):
     if min_step == 'major':
         return 'major'
@@ -158,13 +161,15 @@ def _draw_axis(svg, trace_duration, x_factor):
 
 
 def _per_cpu_fg_to_svg(slices, slices_by_cpu_id, width, height):
-    for cpu_id, cpu_slices in slices_by_cpu_id.items():
-        if not cpu_slices:
+    trace_begin = slices.begin.min().item()
+    trace_end = slices.end.max().item()
+
+    for cpu_id, cpu_rows in slices_by_cpu_id.items():
+        if not len(cpu_rows):
             continue
 
-        trace_begin = min_key(slices, key=lambda s: s.begin)
-        trace_end = max_key(slices, key=lambda s: s.end)
-        max_depth = max_key(cpu_slices, key=lambda s: s.call_depth_or(-1))
+        cpu_depths = slices.call_depth[cpu_rows]
+        max_depth = cpu_depths.max().item()
 
         trace_duration = trace_end - trace_begin
         x_factor = width / trace_duration
@@ -173,18 +178,15 @@ def _per_cpu_fg_to_svg(slices, slices_by_cpu_id, width, height):
         svg = draw_svg.Drawing(width, height)
 
         _draw_axis(svg, trace_duration, x_factor)
-        for slce in cpu_slices:
-            depth = slce.call_depth_or(-1) + 1
-            y = Y_OFFSET + depth*slice_height
-            svg.append(exec_slice_to_rectangle(slce, trace_begin,
-                       x_factor, y, slice_height))
+        ys = Y_OFFSET + (cpu_depths + 1) * slice_height
+        _slices_to_rectangles(svg, slices, cpu_rows, trace_begin, x_factor, ys, slice_height)
 
         svg.saveSvg(f'flamegraph-core{cpu_id}.svg')
 
 
 def _thread_activity_to_svg(slices, slices_by_cpu_id, width, height):
-    trace_begin = min_key(slices, key=lambda s: s.begin)
-    trace_end = max_key(slices, key=lambda s: s.end)
+    trace_begin = slices.begin.min().item()
+    trace_end = slices.end.max().item()
     cpus = len(slices_by_cpu_id.keys())
 
     trace_duration = trace_end - trace_begin
@@ -194,12 +196,12 @@ def _thread_activity_to_svg(slices, slices_by_cpu_id, width, height):
     svg = draw_svg.Drawing(width, height)
 
     _draw_axis(svg, trace_duration, x_factor)
+    is_thread_slice = slices.is_thread_slice()
     y = Y_OFFSET
-    for cpu_slices in slices_by_cpu_id.values():
-        for slce in cpu_slices:
-            if slce.is_thread_slice:
-                svg.append(exec_slice_to_rectangle(slce, trace_begin,
-                                                   x_factor, y, slice_height))
+    for cpu_rows in slices_by_cpu_id.values():
+        thread_rows = cpu_rows[is_thread_slice[cpu_rows]]
+        ys = np.full(len(thread_rows), y)
+        _slices_to_rectangles(svg, slices, thread_rows, trace_begin, x_factor, ys, slice_height)
 
         y += 1.5*slice_height
 
@@ -207,8 +209,11 @@ def _thread_activity_to_svg(slices, slices_by_cpu_id, width, height):
 
 
 def to_svg(slices, width, height):
+    """Draw the flamegraphs of each CPU and the thread activity diagram of the `slices` (a `SliceTable`)"""
+
     height = max(height, Y_OFFSET + 200)
+    slices = slices.in_output_units()
 
-    slices_by_cpu_id = groupby_sorted(slices, lambda s: s.cpu_id)
+    slices_by_cpu_id = group_indices(slices.cpu_id)
     _per_cpu_fg_to_svg(slices, slices_by_cpu_id, width, height)
     _thread_activity_to_svg(slices, slices_by_cpu_id, width, height)
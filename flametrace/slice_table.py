@@ -0,0 +1,614 @@
+'''Storing `ExecSlice`s column-wise in a `SliceTable` instead of one object per slice'''
+
+from flametrace.event_table import NO_ID
+from flametrace.util import ps_to_output_units, thread_id_to_uid, thread_uid_to_id
+
+import numpy as np
+
+
+class SliceTable:
+    '''A table of exec slices, sorted by their begin, with one NumPy array per column. Strings (call names and thread
+    names) are interned into the string table `strings` and stored as IDs into it. The columns are:
+      * `id -> int64`
+      * `type_id -> uint8`: An ID into `TYPES`
+      * `begin -> float64`, `end -> float64`: In picoseconds, like the timestamps of the tracefile. Approximated
+      begins and ends (see `ContinuousSequence`) can be halfway between two picoseconds.
+      * `cpu_id -> int16`
+      * `thread_id -> int32`: The thread ID of the thread uid (0 for all swapper threads, see `thread_uid`)
+      * `thread_name_id -> int32`
+      * `call_depth -> int32`, `call_id -> int64`, `call_name_id -> int32`
+      * `parent -> int64`: The ID of the parent slice
+      * `is_call_begin -> bool`, `is_call_end -> bool`
+      * `position -> int64`: The index of the slice in the order the slices were created in (see
+      `exec_stack.number_slices`), which orders slices that begin at the same time
+
+    The call columns and `parent` are `NO_ID` where a slice does not have the corresponding property, i.e. for thread
+    slices. Single rows can be accessed as `SliceRow`s, which behave like `ExecSlice`s.
+
+    The slices of emulated calls (see `EmulatedCall`) are not rows of the table, but kept compactly in
+    `emulated_calls` until they are needed: `window` only expands the ones within the window, and `expand` all of them.
+    Outputs need all slices as rows, in the unit of the outputs, so they call `in_output_units` first.
+
+    Columns can also be loaded lazily, e.g. from a `cache`: They are only loaded when they are accessed for the first
+    time, and tables derived from this one (e.g. by `take`) load them lazily as well.
+
+    Tables are never modified, so the expanded table (see `expand`) and the `IntervalIndex` of a table are only built
+    once, when they are first needed, and are then kept along with it.'''
+
+    TYPES = ['call', 'thread']
+    CALL = TYPES.index('call')
+    THREAD = TYPES.index('thread')
+
+    COLUMNS = {'id': np.int64,
+               'type_id': np.uint8,
+               'begin': np.float64,
+               'end': np.float64,
+               'cpu_id': np.int16,
+               'thread_id': np.int32,
+               'thread_name_id': np.int32,
+               'call_depth': np.int32,
+               'call_id': np.int64,
+               'call_name_id': np.int32,
+               'parent': np.int64,
+               'is_call_begin': np.bool_,
+               'is_call_end': np.bool_,
+               'position': np.int64}
+
+    def __init__(self, columns, strings, emulated_calls=None):
+        '''Construct a `SliceTable` from a `dict` of equally long `columns` (see `COLUMNS`), the list `strings` the
+        columns' IDs refer to and the `EmulatedCallTable` `emulated_calls`, if there are any. Instead of its values, a
+        column can also be a function without arguments that loads them. Prefer calling `from_slices` instead.'''
+
+        self._loaders = {}
+        for column, dtype in SliceTable.COLUMNS.items():
+            if callable(values := columns[column]):
+                self._loaders[column] = values
+            else:
+                setattr(self, column, np.asarray(values, dtype=dtype))
+
+        self.strings = strings
+        self.emulated_calls = emulated_calls
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set, i.e. columns that have not been loaded yet
+        if name not in (loaders := self.__dict__.get('_loaders', {})):
+            raise AttributeError(name=name, obj=self)
+
+        values = np.asarray(loaders.pop(name)(), dtype=SliceTable.COLUMNS[name])
+        setattr(self, name, values)
+        return values
+
+    def from_slices(slices, emulated_calls=()):
+        '''Build a `SliceTable` from the `slices` and the `emulated_calls` (see `exec_stack.number_slices`). The rows
+        are in the order of the `slices`.'''
+
+        columns = {column: [] for column in SliceTable.COLUMNS}
+        string_ids = {}
+
+        def intern(string):
+            if string is None:
+                return NO_ID
+            if (id := string_ids.get(string)) is None:
+                id = string_ids[string] = len(string_ids)
+            return id
+
+        for position, s in enumerate(slices):
+            is_call_slice = s.is_call_slice
+
+            columns['id'].append(s.id)
+            columns['type_id'].append(SliceTable.CALL if is_call_slice else SliceTable.THREAD)
+            columns['begin'].append(s.begin)
+            columns['end'].append(s.end)
+            columns['cpu_id'].append(s.cpu_id)
+            columns['thread_id'].append(thread_uid_to_id(s.thread_uid))
+            columns['thread_name_id'].append(intern(s.thread_name))
+            columns['call_depth'].append(s.call_depth_or(NO_ID))
+            columns['call_id'].append(s.call_id if is_call_slice else NO_ID)
+            columns['call_name_id'].append(intern(s.call_name))
+            columns['parent'].append(s.parent if s.parent is not None else NO_ID)
+            columns['is_call_begin'].append(is_call_slice and s.is_call_begin)
+            columns['is_call_end'].append(is_call_slice and s.is_call_end)
+            columns['position'].append(position)
+
+        emulated_calls = EmulatedCallTable.from_emulated_calls(emulated_calls, intern) if emulated_calls else None
+
+        return SliceTable(columns, list(string_ids), emulated_calls)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, i):
+        return SliceRow(self, i)
+
+    def __iter__(self):
+        return (SliceRow(self, i) for i in range(len(self)))
+
+    def columns(self):
+        return {column: getattr(self, column) for column in SliceTable.COLUMNS}
+
+    def _map_columns(self, f):
+        '''Apply `f(column, values)` to every column, lazily to the ones that have not been loaded yet'''
+
+        def lazy(column):
+            return lambda: f(column, getattr(self, column))
+
+        return {column: lazy(column) if column in self._loaders else f(column, getattr(self, column))
+                for column in SliceTable.COLUMNS}
+
+    def take(self, indices):
+        '''A new `SliceTable` of the rows at `indices` (a slice, or an array of indices or a mask), sharing the string
+        table and the emulated calls with this one'''
+        return SliceTable(self._map_columns(lambda _, values: values[indices]), self.strings, self.emulated_calls)
+
+    def expand(self):
+        '''A `SliceTable` of all slices, including the ones of the emulated calls, or this table if it does not have
+        any emulated calls'''
+
+        if self.emulated_calls is None:
+            return self
+
+        if (expanded := self.__dict__.get('_expanded')) is None:
+            expanded = self._expanded = self._with_emulated_slices(slice(None))
+
+        return expanded
+
+    def interval_index(self):
+        '''The `IntervalIndex` of this table'''
+
+        if (index := self.__dict__.get('_interval_index')) is None:
+            index = self._interval_index = IntervalIndex(self)
+
+        return index
+
+    def in_output_units(self):
+        '''A new `SliceTable` of all slices (see `expand`) with `begin` and `end` converted from picoseconds into the
+        unit of the outputs (see `util.ps_to_output_units`)'''
+
+        slices = self.expand()
+
+        def convert(column, values):
+            return ps_to_output_units(values) if column in ('begin', 'end') else values
+
+        return SliceTable(slices._map_columns(convert), slices.strings)
+
+    def window(self, begin, end):
+        '''A new `SliceTable` of the slices that overlap the window `(begin, end)`, cut at its boundaries, including
+        the ones of the emulated calls. Cut call slices are neither the begin nor the end of their call anymore. Slices
+        that become empty are left out.'''
+
+        rows = self.interval_index().overlapping(begin, end)
+        if self.emulated_calls is None:
+            overlaps = self.take(rows)
+        else:
+            overlaps = self._with_emulated_slices(rows, self.emulated_calls.phases_overlapping(begin, end))
+
+        window = overlaps._cut(begin, end)
+        return window.take(window.durations() > 0)
+
+    def windows(self, begins, ends):
+        '''A new `SliceTable` of the slices within the disjoint windows `(begins[i], ends[i])` (arrays sorted by begin),
+        cut at their boundaries like by `window`. A slice that overlaps several windows is cut into one slice per
+        window. All but the first of them get new IDs (beyond the ones of this table), and the slices whose parent is
+        one of them are reparented to the one within the same window.'''
+
+        if self.emulated_calls is not None:
+            return self.expand().windows(begins, ends)
+
+        index = self.interval_index()
+        window_rows = [index.overlapping(begin, end) for begin, end in zip(begins.tolist(), ends.tolist())]
+        window_ids = np.repeat(np.arange(len(window_rows)), [len(rows) for rows in window_rows])
+
+        rows = np.concatenate(window_rows) if window_rows else np.zeros(0, dtype=np.int64)
+        cut = self.take(rows)._cut(begins[window_ids], ends[window_ids])
+        is_nonempty = cut.durations() > 0
+        cut = cut.take(is_nonempty)
+        window_ids = window_ids[is_nonempty]
+        if not len(cut):
+            return cut
+
+        # The (unique) key of each slice and window, ordered by slice ID and then window
+        keys = cut.id * len(begins) + window_ids
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        sorted_ids = cut.id[order]
+        is_first = np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1]))
+        new_ids = np.where(is_first, sorted_ids, self.id.max() + np.cumsum(~is_first))
+
+        parent_keys = cut.parent * len(begins) + window_ids
+        parent_i = np.searchsorted(sorted_keys, parent_keys).clip(max=len(cut) - 1)
+        is_cut_parent = (cut.parent != NO_ID) & (sorted_keys[parent_i] == parent_keys)
+
+        columns = cut._map_columns(lambda _, values: values)
+        columns['id'] = np.empty_like(new_ids)
+        columns['id'][order] = new_ids
+        columns['parent'] = np.where(is_cut_parent, new_ids[parent_i], cut.parent)
+
+        return SliceTable(columns, self.strings)
+
+    def _cut(self, begin, end):
+        '''A new `SliceTable` of these slices cut at `begin` and `end` (either scalars or arrays with one value per
+        row). Cut call slices are neither the begin nor the end of their call anymore.'''
+
+        columns = self._map_columns(lambda _, values: values)
+        columns['begin'] = np.maximum(self.begin, begin)
+        columns['end'] = np.minimum(self.end, end)
+        columns['is_call_begin'] = self.is_call_begin & (self.begin >= begin)
+        columns['is_call_end'] = self.is_call_end & (self.end <= end)
+
+        return SliceTable(columns, self.strings)
+
+    def _with_emulated_slices(self, rows, phase_mask=None):
+        '''A new `SliceTable` without emulated calls of the `rows` and the expanded slices of the emulated calls'
+        phases in `phase_mask` (see `EmulatedCallTable.expand`), sorted by begin and then by position'''
+
+        rows = self.take(rows)
+        emulated = self.emulated_calls.expand(phase_mask)
+        is_emulated = np.concatenate((np.zeros(len(rows), dtype=bool), np.ones(len(emulated['id']), dtype=bool)))
+
+        table = SliceTable(rows._map_columns(lambda column, values: np.concatenate((values, emulated[column]))),
+                           self.strings)
+
+        # The slices of an emulated call are created right before the slice at its position
+        return table.take(np.lexsort((table.id, ~is_emulated, table.position, table.begin)))
+
+    ################################################################################################
+
+    def durations(self):
+        return self.end - self.begin
+
+    def is_call_slice(self):
+        return self.type_id == SliceTable.CALL
+
+    def is_thread_slice(self):
+        return self.type_id == SliceTable.THREAD
+
+    def is_swapper(self):
+        return self.thread_id == 0
+
+    def thread_keys(self):
+        '''An integer key per row that is equal for the rows of the same thread uid, which is the thread ID for all
+        threads but swapper threads, and `-(cpu_id + 1)` for those'''
+        return np.where(self.is_swapper(), -(self.cpu_id.astype(np.int32) + 1), self.thread_id)
+
+    def thread_key(thread_uid):
+        '''The key of the given `thread_uid` (see `thread_keys`), or `None` if it is not a valid thread uid'''
+
+        if (thread_id := thread_uid_to_id(thread_uid)) != 0:
+            return thread_id
+        if thread_uid.startswith('swapper/') and (cpu_id := thread_uid[len('swapper/'):]).isdigit():
+            return -(int(cpu_id) + 1)
+
+        return None
+
+    def thread_uid(self, i):
+        return thread_id_to_uid(int(self.thread_id[i]), int(self.cpu_id[i]))
+
+    def string(self, string_id):
+        return self.strings[string_id] if string_id != NO_ID else None
+
+    def string_id(self, string):
+        '''The ID of `string`, or `NO_ID` if it does not occur in this table'''
+        try:
+            return self.strings.index(string)
+        except ValueError:
+            return NO_ID
+
+
+class EmulatedCallTable:
+    '''The emulated calls (see `EmulatedCall`) of a `SliceTable`, stored column-wise without expanding their slices.
+    There is one row per emulated call, with the columns
+      * `first_id -> int64`: The ID of the slice of phase 0
+      * `phases -> int64`: The number of phases the call is emulated for
+      * `phase_offset -> int64`: The offset of the call's phase 0 into the phase columns
+      * `cpu_id -> int16`, `thread_id -> int32`
+      * `call_depth -> int32`, `call_id -> int64`, `call_name_id -> int32`
+      * `next_first_id -> int64`: The `first_id` of the `next` emulated call, or `NO_ID` if there is none
+      * `position -> int64`: The position (see `SliceTable`) of the slices of the call
+
+    and one row per thread slice of the stacks the calls have been emulated in, which the slices of the emulated calls
+    span, with the phase columns
+      * `phase_begin -> float64`, `phase_end -> float64`
+      * `phase_thread_name_id -> int32`
+      * `phase_thread_slice_id -> int64`'''
+
+    CALL_COLUMNS = {'first_id': np.int64,
+                    'phases': np.int64,
+                    'phase_offset': np.int64,
+                    'cpu_id': np.int16,
+                    'thread_id': np.int32,
+                    'call_depth': np.int32,
+                    'call_id': np.int64,
+                    'call_name_id': np.int32,
+                    'next_first_id': np.int64,
+                    'position': np.int64}
+
+    PHASE_COLUMNS = {'phase_begin': np.float64,
+                     'phase_end': np.float64,
+                     'phase_thread_name_id': np.int32,
+                     'phase_thread_slice_id': np.int64}
+
+    COLUMNS = CALL_COLUMNS | PHASE_COLUMNS
+
+    def __init__(self, columns):
+        for column, dtype in EmulatedCallTable.COLUMNS.items():
+            setattr(self, column, np.asarray(columns[column], dtype=dtype))
+
+    def from_emulated_calls(emulated_calls, intern):
+        '''Build an `EmulatedCallTable` of the `emulated_calls`, interning their strings with `intern`'''
+
+        # The thread slices of all stacks that have emulated calls, and the offset of each stack's thread slices
+        thread_slices = []
+        thread_slices_offsets = {}
+        for emulated_call in emulated_calls:
+            stack_thread_slices = emulated_call.stack_thread_slices
+            if id(stack_thread_slices) not in thread_slices_offsets:
+                thread_slices_offsets[id(stack_thread_slices)] = len(thread_slices)
+                thread_slices.extend(stack_thread_slices)
+
+        def column(dtype, values, f):
+            return np.fromiter(map(f, values), dtype=dtype, count=len(values))
+
+        return EmulatedCallTable({
+            'first_id': column(np.int64, emulated_calls, lambda ec: ec.first_id),
+            'phases': column(np.int64, emulated_calls, lambda ec: ec.phases),
+            'phase_offset': column(np.int64, emulated_calls,
+                                   lambda ec: thread_slices_offsets[id(ec.stack_thread_slices)]),
+            'cpu_id': column(np.int16, emulated_calls, lambda ec: ec.cpu_id),
+            'thread_id': column(np.int32, emulated_calls, lambda ec: thread_uid_to_id(ec.thread_uid)),
+            'call_depth': column(np.int32, emulated_calls, lambda ec: ec.call_depth),
+            'call_id': column(np.int64, emulated_calls, lambda ec: ec.call_id),
+            'call_name_id': column(np.int32, emulated_calls, lambda ec: intern(ec.call_name)),
+            'next_first_id': column(np.int64, emulated_calls, lambda ec: ec.next.first_id if ec.next else NO_ID),
+            'position': column(np.int64, emulated_calls, lambda ec: ec.position),
+            'phase_begin': column(np.float64, thread_slices, lambda s: s.begin),
+            'phase_end': column(np.float64, thread_slices, lambda s: s.end),
+            'phase_thread_name_id': column(np.int32, thread_slices, lambda s: intern(s.thread_name)),
+            'phase_thread_slice_id': column(np.int64, thread_slices, lambda s: s.id)})
+
+    def __len__(self):
+        return len(self.first_id)
+
+    def phases_overlapping(self, begin, end):
+        '''A mask of the phases that overlap the window `(begin, end)`'''
+        return (self.phase_end > begin) & (self.phase_begin < end)
+
+    def expand(self, phase_mask=None):
+        '''The `SliceTable` columns of the slices of the emulated calls for the phases in `phase_mask` (all if it is
+        `None`), ordered by emulated call and phase. Slices of empty phases are left out.'''
+
+        # The (phase column) indices of the phases to expand, and the range of them that belongs to each emulated call
+        is_nonempty = self.phase_end > self.phase_begin
+        selected = np.flatnonzero(is_nonempty if phase_mask is None else phase_mask & is_nonempty)
+        first = np.searchsorted(selected, self.phase_offset)
+        counts = np.searchsorted(selected, self.phase_offset + self.phases) - first
+
+        # The emulated call and the phase of each slice
+        i = np.repeat(np.arange(len(self)), counts)
+        phase_i = selected[np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts) + first[i]]
+        phase = phase_i - self.phase_offset[i]
+
+        next_first_ids = self.next_first_id[i]
+
+        return {'id': self.first_id[i] + phase,
+                'type_id': np.full(len(i), SliceTable.CALL, dtype=np.uint8),
+                'begin': self.phase_begin[phase_i],
+                'end': self.phase_end[phase_i],
+                'cpu_id': self.cpu_id[i],
+                'thread_id': self.thread_id[i],
+                'thread_name_id': self.phase_thread_name_id[phase_i],
+                'call_depth': self.call_depth[i],
+                'call_id': self.call_id[i],
+                'call_name_id': self.call_name_id[i],
+                'parent': np.where(next_first_ids != NO_ID,
+                                   next_first_ids + phase,
+                                   self.phase_thread_slice_id[phase_i]),
+                'is_call_begin': np.zeros(len(i), dtype=bool),
+                'is_call_end': np.zeros(len(i), dtype=bool),
+                'position': self.position[i]}
+
+
+class IntervalIndex:
+    '''An index of the rows of a `SliceTable` (which are sorted by begin) that finds
+      * the rows overlapping a window in logarithmic time (plus the time for the rows found): The running maximum of
+      the ends of the rows is sorted just like their begins, so both bound the range of rows that can overlap it.
+      * the first begin and the last end of the slices of a slice ID, call ID or thread key (see
+      `SliceTable.thread_keys`) in logarithmic time, by a binary search of the sorted keys. The keys and their bounds
+      are only computed for each kind of key when it is first looked up.
+      * the bounds of all calls of a call name in logarithmic time (plus the time for the calls found), by a binary
+      search of the calls sorted by call name.
+
+    The index does not include the slices of emulated calls (see `SliceTable.expand`).'''
+
+    KINDS = ['slice', 'call', 'thread']
+
+    def __init__(self, slices):
+        self._slices = slices
+        self._max_end = np.maximum.accumulate(slices.end) if len(slices) else slices.end
+        self._bounds = {}
+        self._calls_by_name = None
+
+    def overlapping(self, begin, end):
+        '''The (ascending) rows of the slices that overlap the window `(begin, end)`'''
+
+        first = np.searchsorted(self._max_end, begin, side='right')
+        last = max(np.searchsorted(self._slices.begin, end, side='left'), first)
+
+        return first + np.flatnonzero(self._slices.end[first:last] > begin)
+
+    def span(self):
+        '''The first begin and the last end of all slices'''
+        return (self._slices.begin[0].item(), self._max_end[-1].item())
+
+    def bounds(self, kind, key):
+        '''The first begin and the last end of the slices with the given `key` of the given `kind` (see `KINDS`), or
+        `None` if there are no such slices'''
+
+        keys, begins, ends, _ = self._key_bounds(kind)
+        if key is None or (i := np.searchsorted(keys, key)) == len(keys) or keys[i] != key:
+            return None
+
+        return (begins[i].item(), ends[i].item())
+
+    def call_intervals(self, call_name_id):
+        '''The bounds (see `bounds`) of all calls with the given call name ID, as arrays of their begins and ends, sorted
+        by begin'''
+
+        if self._calls_by_name is None:
+            _, begins, ends, first_rows = self._key_bounds('call')
+            call_name_ids = self._slices.call_name_id[first_rows]
+            order = np.lexsort((begins, call_name_ids))
+            self._calls_by_name = (call_name_ids[order], begins[order], ends[order])
+
+        call_name_ids, begins, ends = self._calls_by_name
+        first = np.searchsorted(call_name_ids, call_name_id, side='left')
+        last = np.searchsorted(call_name_ids, call_name_id, side='right')
+
+        return (begins[first:last], ends[first:last])
+
+    def _key_bounds(self, kind):
+        '''The sorted unique keys of the given `kind`, the first begin and the last end of the slices of each, and the
+        row of the first slice of each'''
+
+        if (key_bounds := self._bounds.get(kind)) is not None:
+            return key_bounds
+
+        slices = self._slices
+        if kind == 'slice':
+            rows = np.arange(len(slices))
+            keys = slices.id
+        elif kind == 'call':
+            rows = np.flatnonzero(slices.is_call_slice())
+            keys = slices.call_id[rows]
+        else:
+            rows = np.arange(len(slices))
+            keys = slices.thread_keys()
+
+        # The first row of each key in a stable order is the one that begins first
+        order = np.argsort(keys, kind='stable')
+        unique_keys, firsts = np.unique(keys[order], return_index=True)
+        first_rows = rows[order[firsts]]
+        ends = np.maximum.reduceat(slices.end[rows[order]], firsts) if len(unique_keys) else slices.end[first_rows]
+
+        key_bounds = self._bounds[kind] = (unique_keys, slices.begin[first_rows], ends, first_rows)
+        return key_bounds
+
+
+class SliceRow:
+    '''A thin view of the `i`-th row of a `SliceTable` that behaves like the `ExecSlice` it was built from'''
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __repr__(self):
+        return f'SliceRow({self._i})'
+
+    def call_depth_or(self, default=None):
+        return self.call_depth if self.call_depth is not None else default
+
+    ################################################################################################
+    # Properties
+    ################################################################################################
+
+    @property
+    def i(self):
+        return self._i
+
+    @property
+    def begin(self):
+        return self._table.begin[self._i].item()
+
+    @property
+    def end(self):
+        return self._table.end[self._i].item()
+
+    @property
+    def duration(self):
+        return self.end - self.begin
+
+    @property
+    def is_call_begin(self):
+        if not self.is_call_slice:
+            raise AttributeError(obj=self, name='is_call_begin')
+        return bool(self._table.is_call_begin[self._i])
+
+    @property
+    def is_call_end(self):
+        if not self.is_call_slice:
+            raise AttributeError(obj=self, name='is_call_end')
+        return bool(self._table.is_call_end[self._i])
+
+    @property
+    def call_depth(self):
+        return self._id_or_none('call_depth')
+
+    @property
+    def call_id(self):
+        return self._id_or_none('call_id')
+
+    @property
+    def call_name(self):
+        return self._table.string(self._table.call_name_id[self._i])
+
+    @property
+    def cpu_id(self):
+        return int(self._table.cpu_id[self._i])
+
+    @property
+    def id(self):
+        return int(self._table.id[self._i])
+
+    @property
+    def parent(self):
+        return self._id_or_none('parent')
+
+    @property
+    def thread_name(self):
+        return self._table.string(self._table.thread_name_id[self._i])
+
+    @property
+    def thread_uid(self):
+        return self._table.thread_uid(self._i)
+
+    @property
+    def type(self):
+        return SliceTable.TYPES[self._table.type_id[self._i]]
+
+    @property
+    def is_call_slice(self):
+        return self._table.type_id[self._i] == SliceTable.CALL
+
+    @property
+    def is_thread_slice(self):
+        return self._table.type_id[self._i] == SliceTable.THREAD
+
+    def _id_or_none(self, column):
+        id = int(getattr(self._table, column)[self._i])
+        return id if id != NO_ID else None
+
+
+####################################################################################################
+# Grouping
+####################################################################################################
+
+
+def group_indices(keys):
+    '''Group the row indices by the given `keys` (a NumPy array with one key per row), returning a `dict` from each key
+    to the (ascending) indices of its rows, ordered by key'''
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    bounds = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    if not len(keys):
+        return {}
+
+    return dict(zip(sorted_keys[np.concatenate(([0], bounds))].tolist(), np.split(order, bounds)))
+
+
+def group_sums(keys, values):
+    '''Sum the `values` of the rows grouped by `keys` (see `group_indices`), returning the unique keys and their sums.
+    The values of a group are added up in the order of their rows, just like `sum` would.'''
+
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return (unique_keys, np.bincount(inverse.reshape(-1), weights=values, minlength=len(unique_keys)))
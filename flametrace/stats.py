@@ -1,9 +1,11 @@
-from itertools import groupby
 from operator import itemgetter
-from flametrace.util import flatten, groupby_sorted, max_key, thread_uid_to_id
+from flametrace.slice_table import group_indices, group_sums
+from flametrace.util import groupby_sorted, output_number, ps_to_output_units, thread_uid_to_id
 
 import flametrace.calls as calls
 
+import numpy as np
+
 
 def _halve(xs):
     n = len(xs)
@@ -56,6 +58,10 @@ def _quartile_stats(xs):
             'iqr': iqr}
 
 
+def _time_quartile_stats(times):
+    return {k: output_number(v) for k, v in _quartile_stats(times).items()}
+
+
 def _active_time_perc(call):
     return 100 * (call.active_time / call.duration)
 
@@ -65,12 +71,12 @@ def _active_time_self_perc(call):
 
 
 def _compute_per_call_stats(calls):
-    STAT_GETTERS = {'begin': lambda c: c.begin,
-                    'end': lambda c: c.end,
-                    'duration': lambda c: c.duration,
-                    'active-time': lambda c: c.active_time,
+    STAT_GETTERS = {'begin': lambda c: output_number(c.begin),
+                    'end': lambda c: output_number(c.end),
+                    'duration': lambda c: output_number(c.duration),
+                    'active-time': lambda c: output_number(c.active_time),
                     'active-time-perc': _active_time_perc,
-                    'active-time-self': lambda c: c.active_time_self,
+                    'active-time-self': lambda c: output_number(c.active_time_self),
                     'active-time-self-perc': _active_time_self_perc,
                     'is-complete': lambda c: c.is_complete,
                     'id': lambda c: c.id,
@@ -110,13 +116,13 @@ def _compute_function_stats(per_call_stats, trace_stats):
         active_time_self_to_cpus_active_time_perc = 100 * (active_time_self / cpus_active_time)
 
         function_stats[function_name] = {'count': count,
-                                         'duration': duration,
-                                         'duration-iqr': _quartile_stats(durations),
-                                         'active-time': active_time,
-                                         'active-time-iqr': _quartile_stats(active_times),
+                                         'duration': output_number(duration),
+                                         'duration-iqr': _time_quartile_stats(durations),
+                                         'active-time': output_number(active_time),
+                                         'active-time-iqr': _time_quartile_stats(active_times),
                                          'active-time-perc-iqr': _quartile_stats(active_time_percs),
-                                         'active-time-self': active_time_self,
-                                         'active-time-self-iqr': _quartile_stats(active_times_self),
+                                         'active-time-self': output_number(active_time_self),
+                                         'active-time-self-iqr': _time_quartile_stats(active_times_self),
                                          'active-time-self-perc-iqr': _quartile_stats(active_time_self_percs),
                                          'active-time-to-cpus-active-time': active_time_to_cpus_active_time_perc,
                                          'active-time-self-to-cpus-active-time': active_time_self_to_cpus_active_time_perc}
@@ -125,24 +131,35 @@ def _compute_function_stats(per_call_stats, trace_stats):
 
 
 def _compute_thread_stats(thread_slices, trace_stats):
-    thread_slices_by_thread_uid = groupby_sorted(thread_slices,
-                                                 key=lambda s: str(s.thread_uid))
+    thread_keys = thread_slices.thread_keys()
+    slices_by_thread_key = group_indices(thread_keys)
+
+    # The durations of the slices of each thread, sorted by thread key and then duration
+    durations = thread_slices.durations()
+    durations_order = np.lexsort((durations, thread_keys))
+    _, active_times = group_sums(thread_keys[durations_order], durations[durations_order])
+    sorted_durations = np.split(durations[durations_order],
+                                np.cumsum([len(rows) for rows in slices_by_thread_key.values()])[:-1])
+
+    threads = sorted(zip(map(lambda rows: thread_slices.thread_uid(rows[0]), slices_by_thread_key.values()),
+                         slices_by_thread_key.values(),
+                         active_times.tolist(),
+                         sorted_durations),
+                     key=itemgetter(0))
 
     thread_stats = {}
 
-    for thread_uid, slices in thread_slices_by_thread_uid.items():
-        begin = slices[0].begin
-        end = slices[-1].end
+    for thread_uid, rows, active_time, slice_durations in threads:
+        begin = thread_slices.begin[rows].min().item()
+        end = thread_slices.end[rows].max().item()
         duration = end - begin
-        slice_durations = sorted([s.duration for s in slices])
+        slice_durations = slice_durations.tolist()
 
-        slices_by_cpu_id = groupby(slices, lambda s: s.cpu_id)
-        migrations = len(dict(slices_by_cpu_id).keys()) - 1
+        migrations = len(np.unique(thread_slices.cpu_id[rows])) - 1
 
-        active_time = sum(slice_durations)
         active_perc = 100 * (active_time / duration)
 
-        slice_duration_quartiles = _quartile_stats(slice_durations)
+        slice_duration_quartiles = _time_quartile_stats(slice_durations)
 
         total_cpu_time = trace_stats['total-cpu-time']
         active_time_to_total_cpu_time_perc = 100 * (active_time / total_cpu_time)
@@ -153,10 +170,10 @@ def _compute_thread_stats(thread_slices, trace_stats):
         else:
             active_time_to_cpus_active_time_perc = 'N/A'
 
-        thread_stats[thread_uid] = {'begin': begin,
-                                    'end': end,
-                                    'duration': duration,
-                                    'active_time': active_time,
+        thread_stats[thread_uid] = {'begin': output_number(begin),
+                                    'end': output_number(end),
+                                    'duration': output_number(duration),
+                                    'active_time': output_number(active_time),
                                     'active_time_perc': active_perc,
                                     'active-time-to-total-cpu-time-perc': active_time_to_total_cpu_time_perc,
                                     'active-time-to-cpus-active-time_perc': active_time_to_cpus_active_time_perc,
@@ -166,42 +183,41 @@ def _compute_thread_stats(thread_slices, trace_stats):
     return thread_stats
 
 
-def _is_non_swapper_thread_slice(slce):
-    return slce.is_thread_slice and thread_uid_to_id(slce.thread_uid) != 0
-
-
-def _is_swapper_depth0_slice(slce):
-    return thread_uid_to_id(slce.thread_uid) == 0 and slce.call_depth_or(-1) == 0
-
-
-def _compute_trace_stats(slices):
-    trace_begin = slices[0].begin
-    trace_end = max_key(slices, key=lambda s: s.end)
+def _compute_trace_stats(slices, windows):
+    trace_begin = slices.begin.min().item()
+    trace_end = slices.end.max().item()
     trace_duration = trace_end - trace_begin
-    slices_by_cpu_id = groupby_sorted(slices, key=lambda s: s.cpu_id)
-    no_cpus = len(slices_by_cpu_id.keys())
+    if windows is not None:
+        # Only the time within the windows is traced by the slices (the windows may exceed the trace by their context)
+        begins, ends = (np.clip(ps_to_output_units(times), trace_begin, trace_end) for times in windows)
+        trace_duration = (ends - begins).sum().item()
+    cpu_ids, cpu_indices = np.unique(slices.cpu_id, return_inverse=True)
+    no_cpus = len(cpu_ids)
     total_cpu_time = trace_duration * no_cpus
 
+    # Non-swapper thread slices, and swapper call slices of depth 0
+    is_active = np.where(slices.is_swapper(), slices.call_depth == 0, slices.is_thread_slice())
+    cpu_active_times = np.bincount(cpu_indices.reshape(-1)[is_active],
+                                   weights=slices.durations()[is_active],
+                                   minlength=no_cpus)
+
     cpus_active_time = 0
     cpu_statss = {}
-    for cpu_id, cpu_slices in slices_by_cpu_id.items():
-        cpu_active_time = sum(map(lambda s: s.duration,
-                                  filter(lambda s: _is_non_swapper_thread_slice(s) or _is_swapper_depth0_slice(s),
-                                         cpu_slices)))
+    for cpu_id, cpu_active_time in zip(cpu_ids.tolist(), cpu_active_times.tolist()):
         cpu_active_time_perc = 100 * (cpu_active_time / trace_duration)
         cpus_active_time += cpu_active_time
 
-        cpu_statss[cpu_id] = {'cpu-active-time': cpu_active_time,
+        cpu_statss[cpu_id] = {'cpu-active-time': output_number(cpu_active_time),
                               'cpu-active-time-perc': cpu_active_time_perc}
 
     cpus_active_time_perc = 100 * (cpus_active_time / total_cpu_time)
 
     stats = {'no-cpus': no_cpus,
-             'trace-begin': trace_begin,
-             'trace-end': trace_end,
-             'trace-duration': trace_duration,
-             'total-cpu-time': total_cpu_time,
-             'cpus-active-time': cpus_active_time,
+             'trace-begin': output_number(trace_begin),
+             'trace-end': output_number(trace_end),
+             'trace-duration': output_number(trace_duration),
+             'total-cpu-time': output_number(total_cpu_time),
+             'cpus-active-time': output_number(cpus_active_time),
              'cpus-active-time-perc': cpus_active_time_perc}
 
     for cpu_id, cpu_stats in cpu_statss.items():
@@ -210,15 +226,20 @@ def _compute_trace_stats(slices):
     return stats
 
 
-def compute_stats(slices):
-    call_slices = [s for s in slices if s.is_call_slice]
+def compute_stats(slices, windows=None):
+    """Compute the stats of the `slices` (a `SliceTable`), in the unit of the outputs. If the slices are limited to
+    the disjoint `windows` `(begins, ends)` (in picoseconds, see `exec_slices.limit`), the duration of the trace is
+    the total time within them."""
+
+    slices = slices.in_output_units()
+    call_slices = slices.take(slices.is_call_slice())
     calls_ = calls.all_from_slices(call_slices)
 
     per_call_stats = _compute_per_call_stats(calls_)
-    trace_stats = _compute_trace_stats(slices)
+    trace_stats = _compute_trace_stats(slices, windows)
     function_stats = _compute_function_stats(per_call_stats, trace_stats)
 
-    thread_slices = [s for s in slices if s.is_thread_slice]
+    thread_slices = slices.take(slices.is_thread_slice())
 
     return {'function': function_stats,
             'per-call': per_call_stats,
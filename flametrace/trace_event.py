@@ -1,16 +1,15 @@
 '''Representing and parsing tracefile entries/lines as/into `TraceEntry` objects'''
 
-from operator import itemgetter
-from flametrace import config
-from flametrace.util import ps_to_cycles, thread_id_to_uid
+from flametrace.util import symbol, thread_id_to_uid
 
 import re
 
 # Example: "<...>-1234  [001]  9876543210  ftrace_entry: schedule"
-EVENT_REGEX = ('<(?P<thread_info>\S*)>-(?P<thread_id>\d*)'
-               '\s*\[(?P<cpu_id>\d*)\]'
-               '\s*(?P<timestamp>\d*):'
-               '\s*(?P<type_>\S*):\s*(?P<info>.*)')
+EVENT_REGEX = (r'<(?P<thread_info>\S*)>-(?P<thread_id>\d*)'
+               r'\s*\[(?P<cpu_id>\d*)\]'
+               r'\s*(?P<timestamp>\d*):'
+               r'\s*(?P<type_>\S*):\s*(?P<info>.*)')
+EVENT_PATTERN = re.compile(EVENT_REGEX)
 
 
 class TraceEvent:
@@ -21,7 +20,7 @@ class TraceEvent:
       * `thread_name -> str | None`: The name of the thread the event belongs to
       * `thread_uid -> str`: A unique ID of the thread the event belongs to (this is different from the first column
       of the tracefile, as all swapper threads have non-unique ID 0)
-      * `timestamp -> int`: The timestamp of the event
+      * `timestamp -> int`: The timestamp of the event in picoseconds, as found in the tracefile
 
     If the event is of type `'ftrace_entry'`, `'ftrace_exit'`, `'sys_enter'` or `'sys_exit'` it has a a property
     `call_name -> str`.
@@ -29,60 +28,74 @@ class TraceEvent:
     An event of type `'sched_switch'` has the property `sched_switch_info` which returns a map that has the keys
     `'thread_uid_from'`, `'thread_name_from'`, `'thread_uid_to'`, `'thread_name_to'`.
 
+    An event of type `FILTERED` (see `EventFilter`) has no further properties.
+
     Otherwise the event has a type corresponding to the fourth column of the tracefile and a property `info -> str`
     corresponding to the fifth column.
 
     Trying to access a property that does not exist for an event throws an `AttributeError`.
+
+    Call names, thread names and thread uids are interned (see `util.symbol`).
     '''
+    __slots__ = ('_type', '_cpu_id', '_thread_uid', '_thread_name', '_timestamp',
+                 '_call_name', '_info',
+                 '_thread_uid_from', '_thread_name_from', '_thread_uid_to', '_thread_name_to')
 
     def __init__(self, type_, context, **kwargs):
         '''Construct a `TraceEvent` of given `type_`, `context` and `kwargs`. `context` must be a
         `dict` with keys `cpu_id`, `thread_id`, and `timestamp`. `kwargs` will be set on the
-        instance using `setattr`.'''
+        instance using `setattr` and must therefore be named like one of its `__slots__`.'''
 
         self._type = type_
         self._cpu_id = int(context['cpu_id'])
         self._thread_uid = thread_id_to_uid(int(context['thread_id']), self._cpu_id)
+        self._thread_name = None
 
-        timestamp = int(context['timestamp'])
-        self._timestamp = timestamp if not config.TRACE_CONVERT_TO_CYCLES else ps_to_cycles(
-            timestamp)
+        self._timestamp = int(context['timestamp'])
 
         for kw, arg in kwargs.items():
             setattr(self, f'_{kw}', arg)
 
-    def parse(tracefile_line):
+    def parse(tracefile_line, event_filter=None):
         '''Try to parse a single tracefile line into a `TraceEvent`. Throws `ValueError` if parsing
-        fails.'''
+        fails. Lines not kept by the `EventFilter` `event_filter` are parsed into `FILTERED` events.'''
 
         tracefile_line = tracefile_line.strip()
-        if m := re.fullmatch(EVENT_REGEX, tracefile_line):
-            thread_id, cpu_id, timestamp, type_, info = itemgetter('thread_id',
-                                                                   'cpu_id',
-                                                                   'timestamp',
-                                                                   'type_',
-                                                                   'info')(m.groupdict())
-            context = {'thread_id': thread_id,
-                       'cpu_id': cpu_id,
-                       'timestamp': timestamp}
-
-            event = None
-            for parser in [parse_ftrace_entry_exit,
-                           parse_sched_switch,
-                           parse_sys_enter_exit]:
-                event = parser(context, type_, info)
-                if event:
-                    break
-
-            if event is None:
-                event = TraceEvent(type_, context, info=info)
-
-            return event
-        else:
+        fields = _tokenize(tracefile_line) or _tokenize_regex(tracefile_line)
+        if fields is None:
             raise ValueError(tracefile_line)
 
+        thread_id, cpu_id, timestamp, type_, info = fields
+        context = {'thread_id': thread_id,
+                   'cpu_id': cpu_id,
+                   'timestamp': timestamp}
+
+        if event_filter and not event_filter.keeps(type_, info):
+            return TraceEvent(FILTERED, context)
+
+        return _mk_event(context, type_, info)
+
+    def parse_bytes(tracefile_line, event_filter=None):
+        '''Like `parse`, but for a tracefile line given as `bytes`, e.g. read from a memory-mapped
+        tracefile. The numeric columns are converted without decoding them first. Lines that
+        `_tokenize_bytes` cannot handle and `sched_switch` lines are decoded and passed to `parse`.'''
+
+        fields = _tokenize_bytes(tracefile_line.strip())
+        if fields is None or fields[3] == 'sched_switch':
+            return TraceEvent.parse(tracefile_line.decode(), event_filter)
+
+        thread_id, cpu_id, timestamp, type_, info = fields
+        context = {'thread_id': thread_id,
+                   'cpu_id': cpu_id,
+                   'timestamp': timestamp}
+
+        if event_filter and not event_filter.keeps_bytes(type_, info):
+            return TraceEvent(FILTERED, context)
+
+        return _mk_event(context, type_, info.decode())
+
     def __repr__(self):
-        return str(self.__dict__)
+        return str({attr: getattr(self, attr) for attr in TraceEvent.__slots__ if hasattr(self, attr)})
 
     ################################################################################################
     # Properties
@@ -112,11 +125,11 @@ class TraceEvent:
 
     @property
     def thread_name(self):
-        return getattr(self, '_thread_name', None)
+        return self._thread_name
 
     @thread_name.setter
     def thread_name(self, name):
-        setattr(self, '_thread_name', name)
+        self._thread_name = name
 
     @property
     def thread_uid(self):
@@ -131,6 +144,117 @@ class TraceEvent:
         return self._type
 
 
+####################################################################################################
+# Filtering
+#
+# Most consumers of the parsed events only need the details of a few event types. Lines of all other
+# types can be parsed into `FILTERED` events right after tokenizing them, which skips parsing their
+# info and interning its strings. `FILTERED` events are still created, as they only carry the
+# properties every event has (`cpu_id`, `thread_uid`, `timestamp`, ...), which are needed for
+# finding where continuous sequences begin and end.
+####################################################################################################
+
+# Type of events that were filtered by an `EventFilter`
+FILTERED = 'filtered'
+
+# Types of lines whose info is the name of a function call
+FTRACE_TYPES = {'ftrace_entry', 'ftrace_exit'}
+
+
+class EventFilter:
+    '''Decides which tracefile lines are parsed into full `TraceEvent`s: Lines whose (parsed) type is one of `types`,
+    except for function and system calls named like one of `ignored_calls`'''
+
+    def __init__(self, types, ignored_calls=()):
+        self._types = frozenset(types)
+        self._ignored_calls = frozenset(ignored_calls)
+        self._ignored_calls_bytes = frozenset(call.encode() for call in self._ignored_calls)
+        self._kept_types = {}
+
+    def keeps(self, type_, info):
+        '''Whether a line of type `type_` (as found in the tracefile) and `info` is kept'''
+        return self._keeps_type(type_) and not (type_ in FTRACE_TYPES and info in self._ignored_calls)
+
+    def keeps_bytes(self, type_, info):
+        '''Like `keeps`, but for an `info` given as `bytes`'''
+        return self._keeps_type(type_) and not (type_ in FTRACE_TYPES and info in self._ignored_calls_bytes)
+
+    @property
+    def types(self):
+        return self._types
+
+    @property
+    def ignored_calls(self):
+        return self._ignored_calls
+
+    def _keeps_type(self, type_):
+        if (kept := self._kept_types.get(type_)) is None:
+            if m := SYS_ENTER_EXIT_PARSE_PATTERN.fullmatch(type_):
+                sys_type, syscall_name = m.group(1, 2)
+                kept = sys_type in self._types and syscall_name not in self._ignored_calls
+            else:
+                kept = type_ in self._types
+
+            self._kept_types[type_] = kept
+
+        return kept
+
+
+####################################################################################################
+# Tokenizing
+#
+# A tokenizer splits a (stripped) tracefile line into the tuple `(thread_id, cpu_id, timestamp,
+# type_, info)` of strings, or returns `None` if it cannot handle the line. `_tokenize` only handles
+# the usual layout where all columns are separated by whitespace, but does so without regular
+# expressions. Every other line goes through `_tokenize_regex`. `_tokenize_bytes` is the counterpart
+# of `_tokenize` for lines that have not been decoded.
+####################################################################################################
+
+
+def _tokenize(tracefile_line):
+    try:
+        thread, cpu, timestamp, type_, info = tracefile_line.split(None, 4)
+    except ValueError:
+        return None
+
+    thread_info, _, thread_id = thread.rpartition('-')
+    cpu_id = cpu[1:-1]
+
+    if (thread_info[:1] == '<' and thread_info[-1:] == '>'
+            and cpu[0] == '[' and cpu[-1] == ']'
+            and timestamp[-1] == ':' and type_[-1] == ':'
+            and (thread_id + cpu_id + timestamp[:-1]).isdecimal()):
+        return (thread_id, cpu_id, timestamp[:-1], type_[:-1], info)
+
+
+# Decoded event types, so that every type is only decoded once
+_TYPE_NAMES = {}
+
+
+def _tokenize_bytes(tracefile_line):
+    '''Like `_tokenize`, but for `bytes`. Only `type_` is decoded.'''
+
+    try:
+        thread, cpu, timestamp, type_, info = tracefile_line.split(None, 4)
+    except ValueError:
+        return None
+
+    thread_info, _, thread_id = thread.rpartition(b'-')
+    cpu_id = cpu[1:-1]
+
+    if (thread_info[:1] == b'<' and thread_info[-1:] == b'>'
+            and cpu[:1] == b'[' and cpu[-1:] == b']'
+            and timestamp[-1:] == b':' and type_[-1:] == b':'
+            and (thread_id + cpu_id + timestamp[:-1]).isdigit()):
+        type_ = _TYPE_NAMES.get(type_) or _TYPE_NAMES.setdefault(type_, type_[:-1].decode())
+        return (thread_id, cpu_id, timestamp[:-1], type_, info)
+
+
+def _tokenize_regex(tracefile_line):
+    if m := EVENT_PATTERN.fullmatch(tracefile_line):
+        return m.group('thread_id', 'cpu_id', 'timestamp', 'type_', 'info')
+
+
 ####################################################################################################
 # Parsing functions
 #
@@ -149,23 +273,25 @@ def parse_ftrace_entry_exit(context, type_, info):
 
 
 # Example: "m5:1263 [120] TBV ==> swapper/3:0 [120]"
-SCHED_SWITCH_PARSE_REGEX = ('^(?P<name_from>\S*):(?P<id_from>\d*) '
-                            '\[\d*\] TBV ==> '
-                            '(?P<name_to>\S*):(?P<id_to>\d*) \[\d*\]$')
+SCHED_SWITCH_PARSE_REGEX = (r'^(?P<name_from>\S*):(?P<id_from>\d*) '
+                            r'\[\d*\] TBV ==> '
+                            r'(?P<name_to>\S*):(?P<id_to>\d*) \[\d*\]$')
+SCHED_SWITCH_PARSE_PATTERN = re.compile(SCHED_SWITCH_PARSE_REGEX)
 
 
 def parse_sched_switch(context, type_, info):
-    if type_ == 'sched_switch' and (m := re.fullmatch(SCHED_SWITCH_PARSE_REGEX, info)):
-        name_from, id_to, name_to = itemgetter('name_from', 'id_to', 'name_to')(m.groupdict())
+    if type_ == 'sched_switch' and (m := SCHED_SWITCH_PARSE_PATTERN.fullmatch(info)):
+        name_from, id_to, name_to = m.group('name_from', 'id_to', 'name_to')
         return mk_sched_switch(context, name_from, id_to, name_to)
 
 
 # Example: "sys_enter_write"
-SYS_ENTER_EXIT_PARSE_REGEX = '^(sys_enter|sys_exit)_(\S*)$'
+SYS_ENTER_EXIT_PARSE_REGEX = r'^(sys_enter|sys_exit)_(\S*)$'
+SYS_ENTER_EXIT_PARSE_PATTERN = re.compile(SYS_ENTER_EXIT_PARSE_REGEX)
 
 
 def parse_sys_enter_exit(context, type_, _):
-    if m := re.fullmatch(SYS_ENTER_EXIT_PARSE_REGEX, type_):
+    if m := SYS_ENTER_EXIT_PARSE_PATTERN.fullmatch(type_):
         sys_type, syscall_name = m.group(1, 2)
         if sys_type == 'sys_enter':
             return mk_syscall_enter(context, syscall_name)
@@ -173,13 +299,27 @@ def parse_sys_enter_exit(context, type_, _):
             return mk_syscall_exit(context, syscall_name)
 
 
+# The parsing function responsible for each `type_`; all other types are tried with `parse_sys_enter_exit`
+TYPE_PARSERS = {'ftrace_entry': parse_ftrace_entry_exit,
+                'ftrace_exit': parse_ftrace_entry_exit,
+                'sched_switch': parse_sched_switch}
+
+
+def _mk_event(context, type_, info):
+    parser = TYPE_PARSERS.get(type_, parse_sys_enter_exit)
+    if event := parser(context, type_, info):
+        return event
+
+    return TraceEvent(type_, context, info=info)
+
+
 ####################################################################################################
 # Convenience constructors for specific `TraceEvent` types
 ####################################################################################################
 
 
 def mk_ftrace_entry_exit(type_, context, function_name):
-    return TraceEvent(type_, context, call_name=function_name)
+    return TraceEvent(type_, context, call_name=symbol(function_name))
 
 
 def mk_ftrace_entry(context, function_name):
@@ -197,13 +337,13 @@ def mk_sched_switch(context, thread_name_from, thread_id_to, thread_name_to):
     return TraceEvent('sched_switch',
                       context,
                       thread_uid_from=thread_uid_from,
-                      thread_name_from=thread_name_from,
+                      thread_name_from=symbol(thread_name_from),
                       thread_uid_to=thread_uid_to,
-                      thread_name_to=thread_name_to)
+                      thread_name_to=symbol(thread_name_to))
 
 
 def mk_syscall_entry_exit(type_, context, syscall_name):
-    return TraceEvent(type_, context, call_name=syscall_name)
+    return TraceEvent(type_, context, call_name=symbol(syscall_name))
 
 
 def mk_syscall_enter(context, syscall_name):
@@ -0,0 +1,228 @@
+'''A sparse index of a tracefile, stored next to it in a sidecar file (`<tracefile>.ftidx`)
+
+Every `INDEX_STRIDE`th line of the tracefile is a checkpoint, mapping the number and timestamp of the line to its byte
+offset. Given a window of timestamps, the index allows parsing only the region of the tracefile around it instead of
+the whole tracefile (see `stream_window`). The sidecar file is a JSON object with the keys
+  * `version`: The `VERSION` of the index format
+  * `size`, `mtime_ns`: The size and modification time of the tracefile when it was indexed
+  * `first_timestamp`, `m5_timestamp`, `last_timestamp`: The timestamps (in picoseconds) of the first event, the first
+  event belonging to the `m5` thread and the last event, or `null` if there is no such event
+  * `checkpoints`: A list of `[line, timestamp, offset]` triples, where `line` does not count the first line of the
+  tracefile (`cpus=nproc`).
+  * `first_thread_names`: The name of every thread uid when it first appears in a `sched_switch` event
+  * `thread_renames`: A list with one object per checkpoint, mapping the uids of the threads renamed by `sched_switch`
+  events since the previous checkpoint to their names at the checkpoint
+
+Along with the thread names, a region of the tracefile can be parsed and named without looking at the rest of it.
+
+As the window only contains the events near it, calls that are still open when the window begins are only known if
+they begin within the `CONTEXT_CHECKPOINTS` checkpoints before the window. Just like calls that begin before tracing
+was started, calls that begin before the parsed region are "emulated" when they end (see `ExecStack.pop`), and calls
+that span the whole parsed region are missing entirely. Also, call depths are relative to the parsed region, and slice
+and call IDs are not the same as when parsing the whole tracefile.'''
+
+from flametrace.trace_event import EventFilter, TraceEvent
+from flametrace.tracefile import EVENT_TYPES, stream_range, thread_names
+
+import bisect
+import json
+import mmap
+import os
+
+VERSION = 2
+
+# Number of lines between two checkpoints
+INDEX_STRIDE = 1 << 16
+
+# Number of checkpoints before a window that are parsed as well, in order to rebuild the call stacks that are open when
+# the window begins
+CONTEXT_CHECKPOINTS = 2
+
+# Size of the blocks in which lines are counted when indexing
+_BLOCK_SIZE = 1 << 20
+
+
+def index_path(path):
+    return f'{path}.ftidx'
+
+
+####################################################################################################
+# Building
+####################################################################################################
+
+
+def _skip_lines(mm, pos, n):
+    '''Return the offset of the line `n` lines after the one at `pos`, or the end of `mm`'''
+
+    end = len(mm)
+    while pos < end:
+        block_end = min(pos + _BLOCK_SIZE, end)
+        if (lines := mm[pos:block_end].count(b'\n')) < n:
+            n -= lines
+            pos = block_end
+            continue
+
+        for _ in range(n):
+            pos = mm.find(b'\n', pos, block_end) + 1
+        return pos
+
+    return end
+
+
+def _line_at(mm, pos):
+    line_end = mm.find(b'\n', pos)
+    return mm[pos:line_end if line_end != -1 else len(mm)]
+
+
+def _last_line(mm, begin):
+    end = len(mm)
+    while end > begin and mm[end - 1] in b'\r\n':
+        end -= 1
+
+    return mm[(mm.rfind(b'\n', begin, end) + 1) or begin:end]
+
+
+def _timestamp_of(line):
+    return TraceEvent.parse_bytes(line).timestamp
+
+
+def _m5_timestamp(tf, first_thread_names):
+    trace_events = stream_range(tf, 0, os.fstat(tf.fileno()).st_size, event_filter=EventFilter(EVENT_TYPES),
+                                thread_names=(first_thread_names, {}))
+    first_m5 = next(iter(trace_events), None)
+    return first_m5.timestamp if first_m5 else None
+
+
+def _thread_names_at(index, i):
+    '''The pair of the first names of all threads, and the names the threads have at the `i`th checkpoint'''
+
+    curr_thread_name_map = {}
+    for thread_renames in index['thread_renames'][:i + 1]:
+        curr_thread_name_map.update(thread_renames)
+
+    return (index['first_thread_names'], curr_thread_name_map)
+
+
+def build(path):
+    '''Build the index of the (uncompressed) tracefile at `path`'''
+
+    with open(path, 'rb') as tf:
+        stat = os.fstat(tf.fileno())
+        index = {'version': VERSION,
+                 'size': stat.st_size,
+                 'mtime_ns': stat.st_mtime_ns,
+                 'first_timestamp': None,
+                 'm5_timestamp': None,
+                 'last_timestamp': None,
+                 'checkpoints': [],
+                 'first_thread_names': {},
+                 'thread_renames': []}
+
+        if stat.st_size == 0:
+            return index
+
+        with mmap.mmap(tf.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            begin = mm.find(b'\n') + 1 or len(mm)  # Skip cpus=nproc
+
+            line = 0
+            pos = prev_pos = begin
+            while pos < len(mm):
+                index['checkpoints'].append([line, _timestamp_of(_line_at(mm, pos)), pos])
+
+                # The thread names are tracked in the same pass, from the previous checkpoint on
+                first_thread_names, thread_renames = thread_names(mm, prev_pos, pos)
+                for thread_uid, thread_name in first_thread_names.items():
+                    index['first_thread_names'].setdefault(thread_uid, thread_name)
+                index['thread_renames'].append(thread_renames)
+
+                line += INDEX_STRIDE
+                prev_pos = pos
+                pos = _skip_lines(mm, pos, INDEX_STRIDE)
+
+            first_thread_names, _ = thread_names(mm, prev_pos, len(mm))
+            for thread_uid, thread_name in first_thread_names.items():
+                index['first_thread_names'].setdefault(thread_uid, thread_name)
+
+            if index['checkpoints']:
+                index['first_timestamp'] = index['checkpoints'][0][1]
+                index['last_timestamp'] = _timestamp_of(_last_line(mm, begin))
+
+        index['m5_timestamp'] = _m5_timestamp(tf, index['first_thread_names'])
+
+    return index
+
+
+def save(index, path):
+    with open(path, 'w') as f:
+        json.dump(index, f)
+
+
+def load(path):
+    with open(path) as f:
+        index = json.load(f)
+
+    if (version := index.get('version')) != VERSION:
+        raise ValueError(f'"{path}" has index version {version}, but only version {VERSION} is supported')
+
+    return index
+
+
+def _is_current(index, path):
+    stat = os.stat(path)
+    return index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns
+
+
+def load_or_build(path):
+    '''Load the index of the tracefile at `path` from its sidecar file, (re)building and saving it if it is missing or
+    stale'''
+
+    try:
+        if _is_current(index := load(index_path(path)), path):
+            return index
+    except (FileNotFoundError, KeyError, ValueError):
+        pass
+
+    index = build(path)
+    try:
+        save(index, index_path(path))
+    except OSError as e:
+        print(f'WARNING: Could not save the tracefile index: {repr(e)}')
+
+    return index
+
+
+####################################################################################################
+# Windows
+####################################################################################################
+
+
+def bounds(index, filter_pre_m5=True):
+    '''The begin and end of the slices of the whole tracefile, as timestamps, or `None` if there are no events'''
+
+    begin = index['m5_timestamp'] if filter_pre_m5 else index['first_timestamp']
+    end = index['last_timestamp']
+    if begin is None or end is None:
+        return None
+
+    return (begin, end)
+
+
+def stream_window(tracefile, index, window, filter_pre_m5=True, event_filter=None):
+    '''Parse the region of the given binary `tracefile` that contains the `window` `(begin, end)` of timestamps, along
+    with the `CONTEXT_CHECKPOINTS` checkpoints before it (see `tracefile.stream_range`)'''
+
+    checkpoints = index['checkpoints']
+    timestamps = [timestamp for _, timestamp, _ in checkpoints]
+    window_begin, window_end = window
+
+    i = max(bisect.bisect_right(timestamps, window_begin) - 1 - CONTEXT_CHECKPOINTS, 0)
+    j = bisect.bisect_right(timestamps, window_end)
+
+    begin = checkpoints[i][2]
+    end = checkpoints[j][2] if j < len(checkpoints) else index['size']
+
+    # Only filter within the region if the first m5 event is not before it
+    filter_pre_m5 = filter_pre_m5 and index['m5_timestamp'] >= timestamps[i]
+
+    return stream_range(tracefile, begin, end, filter_pre_m5=filter_pre_m5, event_filter=event_filter,
+                        thread_names=_thread_names_at(index, i))
@@ -1,51 +1,429 @@
-from itertools import dropwhile
+from io import TextIOBase, TextIOWrapper
+from itertools import chain, dropwhile, islice
+from multiprocessing import Pool
+from queue import Queue
+from threading import Event, Thread
+from flametrace.event_table import NO_ID, EventTable
 from flametrace.trace_event import TraceEvent
 
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Number of chunks per job when parsing in parallel; more chunks balance the load better
+CHUNKS_PER_JOB = 4
+
+
+def _lines(tracefile):
+    return islice(tracefile, 1, None)  # Skip cpus=nproc
+
+
+def _track_thread_names(te, curr_thread_name_map, first_name_map):
+    sw_info = te.sched_switch_info
+
+    uid_from = sw_info['uid_from']
+    name_from = sw_info['name_from']
+    uid_to = sw_info['uid_to']
+    name_to = sw_info['name_to']
+
+    if not (uid_from in curr_thread_name_map):
+        first_name_map[uid_from] = name_from
+    if not (uid_to in curr_thread_name_map):
+        first_name_map[uid_to] = name_to
+
+    curr_thread_name_map[uid_from] = name_from
+    curr_thread_name_map[uid_to] = name_to
+
+
+def _first_thread_names(lines):
+    """Map every thread uid to the name it has when it first appears in a `sched_switch` event. Only lines that can
+    possibly be `sched_switch` events are parsed."""
 
-def _with_thread_names(trace_events):
     curr_thread_name_map = {}
     first_name_map = {}
-    unnamed_entries = []
 
-    def try_set_name(te, name_map):
-        if thread_name := name_map.get(te.thread_uid):
-            te.thread_name = thread_name
-            return True
-        else:
-            return False
+    for line in lines:
+        if 'sched_switch' not in line:
+            continue
 
-    for te in trace_events:
+        te = TraceEvent.parse(line)
+        if te.type == 'sched_switch':
+            _track_thread_names(te, curr_thread_name_map, first_name_map)
+
+    return first_name_map
+
+
+def _sched_switch_lines(buf, begin, end):
+    """Find all lines in `buf[begin:end]` (`bytes` or an `mmap`) that can possibly be `sched_switch` events, without
+    looking at any other line"""
+
+    pos = buf.find(b'sched_switch', begin, end)
+    while pos != -1:
+        line_begin = buf.rfind(b'\n', begin, pos) + 1 or begin
+        line_end = buf.find(b'\n', pos, end)
+        line_end = line_end if line_end != -1 else end
+
+        yield buf[line_begin:line_end]
+        pos = buf.find(b'sched_switch', line_end, end)
+
+
+def _thread_names_in(ranges):
+    """Return the pair `(first_name_map, curr_thread_name_map)` of the names each thread has when it first appears in
+    a `sched_switch` event, and the names each thread has at the end of the lines in the given consecutive
+    `(buf, begin, end)` ranges, where `buf` is `bytes` or an `mmap`"""
+
+    curr_thread_name_map = {}
+    first_name_map = {}
+
+    for line in chain.from_iterable(_sched_switch_lines(*range_) for range_ in ranges):
+        te = TraceEvent.parse_bytes(line)
         if te.type == 'sched_switch':
-            sw_info = te.sched_switch_info
+            _track_thread_names(te, curr_thread_name_map, first_name_map)
+
+    return (first_name_map, curr_thread_name_map)
+
+
+def _first_thread_names_in(ranges):
+    """Like `_first_thread_names`, but for the lines in the given consecutive `(buf, begin, end)` ranges, where `buf`
+    is `bytes` or an `mmap`"""
+
+    first_name_map, _ = _thread_names_in(ranges)
+    return first_name_map
+
+
+def _mmap_lines(mm, begin, end):
+    mm.seek(begin)
+    while mm.tell() < end:
+        yield mm.readline()
 
-            uid_from = sw_info['uid_from']
-            name_from = sw_info['name_from']
-            uid_to = sw_info['uid_to']
-            name_to = sw_info['name_to']
 
-            if not (uid_from in curr_thread_name_map):
-                first_name_map[uid_from] = name_from
-            if not (uid_to in curr_thread_name_map):
-                first_name_map[uid_to] = name_to
+def _with_thread_names(trace_events, first_name_map, curr_thread_name_map=None):
+    """Lazily name the given `trace_events`. An event is named after the name its thread currently has, or the first
+    name the thread ever has if it has not been seen in a `sched_switch` event yet. `curr_thread_name_map` are the
+    names the threads have before the first of the `trace_events`."""
 
-            curr_thread_name_map[uid_from] = name_from
-            curr_thread_name_map[uid_to] = name_to
+    curr_thread_name_map = dict(curr_thread_name_map or {})
 
-        if not try_set_name(te, curr_thread_name_map):
-            unnamed_entries.append(te)
+    for te in trace_events:
+        if te.type == 'sched_switch':
+            _track_thread_names(te, curr_thread_name_map, {})
+
+        thread_uid = te.thread_uid
+        if thread_name := curr_thread_name_map.get(thread_uid) or first_name_map.get(thread_uid):
+            te.thread_name = thread_name
 
-    for te in unnamed_entries:
-        try_set_name(te, first_name_map)
+        yield te
 
 
 def _filter_pre_m5(trace_events):
-    return list(dropwhile(lambda te: te.thread_name != 'm5', trace_events))
+    return dropwhile(lambda te: te.thread_name != 'm5', trace_events)
+
+
+def _stream_text(tracefile, event_filter):
+    if tracefile.seekable():
+        pos = tracefile.tell()
+        first_name_map = _first_thread_names(_lines(tracefile))
+        tracefile.seek(pos)
+        lines = _lines(tracefile)
+    else:
+        lines = list(_lines(tracefile))
+        first_name_map = _first_thread_names(lines)
+
+    trace_events = (TraceEvent.parse(line, event_filter) for line in lines)
+    return _with_thread_names(trace_events, first_name_map)
+
+
+def _stream_mmap(mm, event_filter):
+    begin = _data_begin(mm)
+    end = len(mm)
+
+    first_name_map = _first_thread_names_in([(mm, begin, end)])
+
+    trace_events = (TraceEvent.parse_bytes(line, event_filter) for line in _mmap_lines(mm, begin, end))
+    return _with_thread_names(trace_events, first_name_map)
+
+
+def _stream_binary(tracefile, event_filter):
+    if open_decompressed := _decompressor(tracefile):
+        return _stream_compressed(tracefile, open_decompressed, event_filter)
+    if not tracefile.seekable():
+        return _stream_text(TextIOWrapper(tracefile), event_filter)
+    if os.fstat(tracefile.fileno()).st_size == 0:
+        return iter(())
+
+    return _stream_mapped(tracefile, event_filter)
+
+
+def _stream_mapped(tracefile, event_filter):
+    # The tracefile is only mapped while its events are streamed
+    with mmap.mmap(tracefile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from _stream_mmap(mm, event_filter)
+
+
+def _data_begin(mm):
+    return mm.find(b'\n') + 1 or len(mm)  # Skip cpus=nproc
+
+
+def _stream_range(mm, begin, end, event_filter, thread_names):
+    if thread_names:
+        first_name_map, curr_thread_name_map = thread_names
+    else:
+        first_name_map, curr_thread_name_map = _thread_names_in([(mm, _data_begin(mm), begin)])
+        for thread_uid, thread_name in _first_thread_names_in([(mm, begin, len(mm))]).items():
+            first_name_map.setdefault(thread_uid, thread_name)
+
+    trace_events = (TraceEvent.parse_bytes(line, event_filter) for line in _mmap_lines(mm, begin, end))
+    return _with_thread_names(trace_events, first_name_map, curr_thread_name_map)
+
+
+def _stream_mapped_range(tracefile, begin, end, event_filter, thread_names):
+    # The tracefile is only mapped while the events of the range are streamed
+    with mmap.mmap(tracefile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from _stream_range(mm, max(begin, _data_begin(mm)), end, event_filter, thread_names)
+
+
+####################################################################################################
+# Compressed tracefiles
+#
+# Compressed tracefiles are detected by their magic bytes and decompressed on a separate thread
+# while the lines decompressed so far are being parsed. As the first names of all threads must be
+# known before naming the first event, a seekable tracefile is decompressed twice instead of holding
+# it in memory.
+####################################################################################################
+
+# Size of the blocks read from a decompressed tracefile, and the number of blocks that can be queued
+DECOMPRESS_BLOCK_SIZE = 1 << 20
+DECOMPRESS_QUEUE_SIZE = 16
+
+
+def _open_zstd(tracefile):
+    if zstandard is None:
+        raise ValueError('The tracefile is zstd-compressed, but the zstandard package is not installed')
+    return zstandard.ZstdDecompressor().stream_reader(tracefile, read_across_frames=True, closefd=False)
+
+
+DECOMPRESSORS = {b'\x1f\x8b': lambda tracefile: gzip.GzipFile(fileobj=tracefile),
+                 b'BZh': bz2.BZ2File,
+                 b'\xfd7zXZ\x00': lzma.LZMAFile,
+                 b'\x28\xb5\x2f\xfd': _open_zstd}
+
+
+def _decompressor(tracefile):
+    """Return the function opening a decompressed view of the binary `tracefile` if it is compressed, else `None`"""
+
+    if hasattr(tracefile, 'peek'):
+        magic = tracefile.peek(6)
+    else:
+        pos = tracefile.tell()
+        magic = tracefile.read(6)
+        tracefile.seek(pos)
+
+    for decompressor_magic, open_decompressed in DECOMPRESSORS.items():
+        if magic.startswith(decompressor_magic):
+            return open_decompressed
+
+
+def is_compressed(tracefile):
+    return _decompressor(tracefile) is not None
+
+
+def _decompress(tracefile, open_decompressed, blocks, stopped):
+    try:
+        with open_decompressed(tracefile) as f:
+            while (block := f.read(DECOMPRESS_BLOCK_SIZE)) and not stopped.is_set():
+                blocks.put(block)
+        blocks.put(None)
+    except Exception as e:
+        blocks.put(e)
+
+
+def _decompressed_blocks(tracefile, open_decompressed):
+    """Decompress the binary `tracefile` from its current position on a separate thread, and yield the decompressed
+    data in blocks of whole lines"""
+
+    blocks = Queue(DECOMPRESS_QUEUE_SIZE)
+    stopped = Event()
+    Thread(target=_decompress, args=(tracefile, open_decompressed, blocks, stopped), daemon=True).start()
+
+    try:
+        rest = b''
+        while (block := blocks.get()) is not None:
+            if isinstance(block, Exception):
+                raise block
+
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+
+            if end:
+                yield block[:end]
+
+        if rest:
+            yield rest
+    finally:
+        # Unblock the decompressing thread if the blocks are not consumed until the end
+        stopped.set()
+        while not blocks.empty():
+            blocks.get_nowait()
+
+
+def _stream_compressed(tracefile, open_decompressed, event_filter):
+    if tracefile.seekable():
+        pos = tracefile.tell()
+        blocks = _decompressed_blocks(tracefile, open_decompressed)
+        first_name_map = _first_thread_names_in((block, 0, len(block)) for block in blocks)
+        tracefile.seek(pos)
+        blocks = _decompressed_blocks(tracefile, open_decompressed)
+    else:
+        blocks = list(_decompressed_blocks(tracefile, open_decompressed))
+        first_name_map = _first_thread_names_in((block, 0, len(block)) for block in blocks)
+
+    lines = islice(chain.from_iterable(block.splitlines() for block in blocks), 1, None)  # Skip cpus=nproc
+    trace_events = (TraceEvent.parse_bytes(line, event_filter) for line in lines)
+    return _with_thread_names(trace_events, first_name_map)
+
+
+####################################################################################################
+# Parallel parsing
+#
+# The tracefile is split at line boundaries into byte ranges (chunks) that are parsed by a pool of
+# worker processes. Each worker returns its chunk as a compact `EventTable` of unnamed events, which
+# the parent concatenates in chunk order. Thread names cannot be resolved within a chunk, as a
+# thread's current name can stem from an earlier chunk. Therefore the parent names all events at
+# once from the `sched_switch` rows of the concatenated table.
+####################################################################################################
+
+
+def _chunks(path, n):
+    """Split the file at `path` (except its first line) into at most `n` `(path, begin, end)` byte ranges that begin
+    and end at line boundaries"""
+
+    with open(path, 'rb') as f:
+        f.readline()  # Skip cpus=nproc
+        begin = f.tell()
+        size = os.fstat(f.fileno()).st_size
+
+        chunks = []
+        for i in range(1, n + 1):
+            f.seek(max(begin, size * i // n))
+            f.readline()
+            end = min(f.tell(), size)
 
+            if end > begin:
+                chunks.append((path, begin, end))
+                begin = end
 
-def parse(tracefile, filter_pre_m5=True):
-    lines = tracefile.readlines()[1:]  # Skip cpus=nproc
-    trace_events = [TraceEvent.parse(line) for line in lines]
-    _with_thread_names(trace_events)
+    return chunks
+
+
+def _chunk_mmap(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _parse_chunk(chunk_and_filter):
+    (path, begin, end), event_filter = chunk_and_filter
+
+    with _chunk_mmap(path) as mm:
+        trace_events = (TraceEvent.parse_bytes(line, event_filter) for line in _mmap_lines(mm, begin, end))
+        return EventTable.from_events(trace_events)
+
+
+def _thread_keys(thread_ids, cpu_ids):
+    # Like thread uids, but as integers: swapper threads get the negative key -(cpu_id + 1)
+    return np.where(thread_ids != 0, thread_ids.astype(np.int64), -(cpu_ids.astype(np.int64) + 1))
+
+
+def _name_threads(table):
+    """Name the events of the `EventTable` `table` in place, exactly like `_with_thread_names` with the names its
+    threads have in the `sched_switch` events of `table`"""
+
+    n = len(table)
+    switches = np.flatnonzero(table.switch_to_thread_id != NO_ID)
+    if not len(switches):
+        table.thread_name_id = np.full(n, NO_ID, dtype=np.int32)
+        return
+
+    # Every `sched_switch` event first renames the thread switched from, then the thread switched to. The uid of a
+    # swapper thread switched to is '0', which is never the uid of an event's thread (see `mk_sched_switch`).
+    to_keys = table.switch_to_thread_id[switches].astype(np.int64)
+    to_keys[to_keys == 0] = np.iinfo(np.int64).min
+    rename_keys = np.stack([_thread_keys(table.thread_id[switches], table.cpu_id[switches]), to_keys], axis=1).ravel()
+    rename_names = np.stack([table.switch_name_from_id[switches], table.switch_name_to_id[switches]], axis=1).ravel()
+
+    # Sort the renames by thread, then row, encoding each `(thread, row)` pair as `thread * (n + 1) + row`
+    keys = np.unique(rename_keys)
+    rename_positions = np.searchsorted(keys, rename_keys) * (n + 1) + np.repeat(switches, 2)
+    order = np.argsort(rename_positions, kind='stable')
+    rename_positions = rename_positions[order]
+    rename_threads = rename_positions // (n + 1)
+    # Empty names count as no name, just like in `_with_thread_names`
+    rename_names = rename_names[order]
+    rename_names[np.isin(rename_names, table.string_ids(['']))] = NO_ID
+
+    event_keys = _thread_keys(table.thread_id, table.cpu_id)
+    event_threads = np.minimum(np.searchsorted(keys, event_keys), len(keys) - 1)
+    is_renamed = keys[event_threads] == event_keys
+
+    def rename_of_thread(i):
+        i = np.clip(i, 0, len(rename_positions) - 1)
+        return np.where(is_renamed & (rename_threads[i] == event_threads), rename_names[i], NO_ID)
+
+    # The name of the last rename of each event's thread at or before it, else of the thread's first rename
+    event_positions = event_threads * (n + 1) + np.arange(n)
+    curr_names = rename_of_thread(np.searchsorted(rename_positions, event_positions, side='right') - 1)
+    first_names = rename_of_thread(np.searchsorted(rename_positions, event_threads * (n + 1)))
+
+    table.thread_name_id = np.where(curr_names != NO_ID, curr_names, first_names).astype(np.int32)
+
+
+def _table_parallel(path, jobs, event_filter):
+    chunks = _chunks(path, jobs * CHUNKS_PER_JOB)
+
+    with Pool(jobs) as pool:
+        table = EventTable.concatenate(pool.imap(_parse_chunk, ((chunk, event_filter) for chunk in chunks)))
+
+    _name_threads(table)
+    return table
+
+
+####################################################################################################
+
+
+# Event types that must be parsed fully for naming threads and finding benchmark events, see `EventFilter`
+EVENT_TYPES = {'sched_switch', 'trace_info'}
+
+
+def stream(tracefile, filter_pre_m5=True, jobs=1, event_filter=None):
+    """Lazily parse the given `tracefile` into `TraceEvent`s. `tracefile` can be a file opened in text or binary mode,
+    or an `mmap`. Binary files are memory-mapped, and memory-mapped files are parsed as `bytes` without decoding them
+    as a whole. Binary files compressed with gzip, bzip2, xz or (if the `zstandard` package is installed) zstd are
+    decompressed on the fly. In any case, the tracefile is never held in memory as a whole.
+
+    If `jobs > 1`, the file (which then must be a regular, uncompressed file) is parsed in parallel by `jobs` worker
+    processes into an `EventTable` (see `parse_table`), whose rows are returned.
+
+    If an `EventFilter` `event_filter` is given, the lines it does not keep are parsed into `FILTERED` events. It must
+    keep (at least) the `EVENT_TYPES`."""
+
+    if jobs > 1 and not _decompressor(tracefile):
+        return iter(parse_table(tracefile, filter_pre_m5=filter_pre_m5, jobs=jobs, event_filter=event_filter))
+
+    if isinstance(tracefile, mmap.mmap):
+        trace_events = _stream_mmap(tracefile, event_filter)
+    elif isinstance(tracefile, TextIOBase):
+        trace_events = _stream_text(tracefile, event_filter)
+    else:
+        trace_events = _stream_binary(tracefile, event_filter)
 
     if filter_pre_m5:
         trace_events = _filter_pre_m5(trace_events)
@@ -53,21 +431,176 @@ def parse(tracefile, filter_pre_m5=True):
     return trace_events
 
 
-def benchmark_events(trace_events):
-    EVENT_MAP = {'ROI start': 'roi_start',
-                 'ROI end': 'roi_end',
-                 'Benchmark start': 'benchmark_start',
-                 'Benchmark end': 'benchmark_end'}
+def parse_table(tracefile, filter_pre_m5=True, jobs=1, event_filter=None):
+    """Like `stream`, but parse the given `tracefile` into an `EventTable`. If `jobs > 1`, the workers hand their parsed
+    chunks back as compact `EventTable`s instead of as single events."""
 
-    events = {}
+    if jobs > 1 and not _decompressor(tracefile):
+        table = _table_parallel(tracefile.name, jobs, event_filter)
+        return table.filter_pre_m5() if filter_pre_m5 else table
 
-    for te in trace_events:
-        if te.type != 'trace_info':
-            continue
+    return EventTable.from_events(stream(tracefile, filter_pre_m5=filter_pre_m5, event_filter=event_filter))
+
+
+def thread_names(buf, begin, end):
+    """Return the pair `(first_name_map, curr_thread_name_map)` of the names each thread has when it first appears in a
+    `sched_switch` event in `buf[begin:end]` (`bytes` or an `mmap`), and the names the threads have at its end"""
+
+    return _thread_names_in([(buf, begin, end)])
+
+
+def stream_range(tracefile, begin, end, filter_pre_m5=True, event_filter=None, thread_names=None):
+    """Like `stream`, but only parse the lines in the byte range `[begin, end)` of the given binary, uncompressed and
+    seekable `tracefile` (e.g. found using a `trace_index`). `begin` and `end` must be at line boundaries. The events
+    are named exactly as if the whole tracefile had been parsed. If `filter_pre_m5`, the events before the first event
+    belonging to the `m5` thread *within the range* are filtered.
+
+    Naming the events needs the pair `thread_names` of the names every thread has when it first appears in a
+    `sched_switch` event in the whole tracefile, and the names the threads have at `begin` (see `trace_index`). If it is
+    not given, it is found by scanning the rest of the tracefile for `sched_switch` events."""
+
+    trace_events = _stream_mapped_range(tracefile, begin, end, event_filter, thread_names)
+
+    if filter_pre_m5:
+        trace_events = _filter_pre_m5(trace_events)
+
+    return trace_events
+
+
+def follow(tracefile, filter_pre_m5=True, event_filter=None):
+    """Parse the given binary, uncompressed `tracefile` while it is still being written, e.g. by a running simulation.
+    Returns a `FollowedTracefile`: Every time its iterator is advanced, it parses the complete lines appended to the
+    tracefile since, and yields them as a (possibly empty) list of `TraceEvent`s. Once the tracefile is complete,
+    `finish` returns the rest of the events. Filtering with `filter_pre_m5` and `event_filter` works just like for
+    `stream`."""
+
+    return FollowedTracefile(tracefile, filter_pre_m5, event_filter)
+
+
+class FollowedTracefile:
+    """A tracefile that is parsed while it is still being written (see `follow`). Every line is only read and parsed
+    once. The tracefile is read in blocks of `DECOMPRESS_BLOCK_SIZE` bytes, and the lines of each block are yielded on
+    their own, so that a long tracefile (e.g. when following it only after some time) is never read at once. An empty
+    list is only yielded once all lines written so far have been parsed.
+
+    Unlike `stream`, events can only be named after the names their threads have had so far, i.e. events of a thread
+    before its first `sched_switch` event are not named (see `exec_slices.LiveSlices`, which names their slices once
+    it is). If `filter_pre_m5`, the events from the first one of a thread that is not named yet are held back until
+    the first event of the `m5` thread is found, so that the events of the `m5` thread before its first `sched_switch`
+    event are not filtered. Thus, once finished, the events are the same as the ones of `stream`, except for the names
+    of the events of threads before their first `sched_switch` event (and unless a thread that is only named `m5`
+    later precedes the first event named `m5`)."""
+
+    def __init__(self, tracefile, filter_pre_m5, event_filter):
+        self._tracefile = tracefile
+        self._event_filter = event_filter
+
+        # The position up to which the tracefile has been parsed, and the incomplete last line parsed so far
+        self._pos = tracefile.tell()
+        self._rest = b''
+        self._is_first_line = True
+
+        self._curr_thread_name_map = {}
+        self._first_name_map = {}
+
+        # The events that are held back until it is known which of them are filtered as pre-m5 events, or `None` if
+        # no (more) events are filtered
+        self._pre_m5 = [] if filter_pre_m5 else None
+
+    def __iter__(self):
+        while True:
+            block = self._tracefile.read(DECOMPRESS_BLOCK_SIZE) or b''
+            is_caught_up = len(block) < DECOMPRESS_BLOCK_SIZE
+
+            if (trace_events := self._parse(block)) or is_caught_up:
+                yield trace_events
+
+    def finish(self):
+        """Parse the rest of the tracefile once it is complete (including a last line without a newline), and return
+        its events along with the ones held back so far"""
+
+        # The iterator may have been interrupted while parsing a block, which is then parsed again
+        self._tracefile.seek(self._pos)
+
+        trace_events = []
+        while block := self._tracefile.read(DECOMPRESS_BLOCK_SIZE):
+            trace_events.extend(self._parse(block))
+
+        return trace_events + self._parse(b'', is_complete=True)
+
+    def _parse(self, block, is_complete=False):
+        block = self._rest + block
+        end = len(block) if is_complete else block.rfind(b'\n') + 1
+
+        lines = block[:end].splitlines()
+        is_first_line = self._is_first_line and not lines
+        if self._is_first_line and lines:
+            lines = lines[1:]  # Skip cpus=nproc
+
+        trace_events = [TraceEvent.parse_bytes(line, self._event_filter) for line in lines]
+        for te in trace_events:
+            if te.type == 'sched_switch':
+                _track_thread_names(te, self._curr_thread_name_map, self._first_name_map)
 
-        trace_info = te.info
-        if trace_info in EVENT_MAP.keys():
-            e = EVENT_MAP[trace_info]
+            if thread_name := self._curr_thread_name_map.get(te.thread_uid):
+                te.thread_name = thread_name
+
+        self._pos += len(block) - len(self._rest)
+        self._rest = block[end:]
+        self._is_first_line = is_first_line
+
+        return self._filter_pre_m5(trace_events, is_complete)
+
+    def _filter_pre_m5(self, trace_events, is_complete):
+        if self._pre_m5 is None:
+            return trace_events
+
+        # Like `stream`, filter the events before the first one of the `m5` thread, taking the names threads get when
+        # they are first named into account
+        pre_m5 = self._pre_m5 + trace_events
+        first_unnamed = None
+        for i, te in enumerate(pre_m5):
+            if (thread_name := te.thread_name or self._first_name_map.get(te.thread_uid)) == 'm5':
+                trace_events = pre_m5[i:]
+                for te in trace_events:
+                    if not te.thread_name and (thread_name := self._first_name_map.get(te.thread_uid)):
+                        te.thread_name = thread_name
+
+                self._pre_m5 = None
+                return trace_events
+
+            if thread_name is None and first_unnamed is None:
+                first_unnamed = i
+
+        # Events before the first one of a thread that is not named yet are filtered in any case
+        self._pre_m5 = pre_m5[first_unnamed:] if first_unnamed is not None and not is_complete else []
+        return []
+
+
+def parse(tracefile, filter_pre_m5=True, jobs=1, event_filter=None):
+    return list(stream(tracefile, filter_pre_m5=filter_pre_m5, jobs=jobs, event_filter=event_filter))
+
+
+BENCHMARK_EVENT_MAP = {'ROI start': 'roi_start',
+                       'ROI end': 'roi_end',
+                       'Benchmark start': 'benchmark_start',
+                       'Benchmark end': 'benchmark_end'}
+
+
+def with_benchmark_events(trace_events, events):
+    """Pass through the given `trace_events`, collecting all benchmark events into the `dict` `events` along the way"""
+
+    for te in trace_events:
+        if te.type == 'trace_info' and (e := BENCHMARK_EVENT_MAP.get(te.info)):
             events[e] = te.timestamp
 
+        yield te
+
+
+def benchmark_events(trace_events):
+    events = {}
+
+    for _ in with_benchmark_events(trace_events, events):
+        pass
+
     return events
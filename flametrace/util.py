@@ -1,5 +1,6 @@
 from itertools import groupby
 import flametrace.config as config
+import sys
 
 
 def flatten(l):
@@ -31,8 +32,33 @@ def cycles_to_ps(cycles):
     return (cycles * 1000) / config.CPU_GHZ
 
 
+def ps_to_output_units(ps):
+    """Convert picoseconds, in which all timestamps are kept, into the unit of the outputs: cycles, unless
+    `config.TRACE_CONVERT_TO_CYCLES` is off"""
+    return ps if not config.TRACE_CONVERT_TO_CYCLES else ps_to_cycles(ps)
+
+
+def output_number(time):
+    """Return the `time` (in the unit of the outputs) as an `int` if it is a whole number, so that whole picoseconds are
+    output just like the timestamps in the tracefile, even though they are kept as floats. Whole numbers of cycles are
+    output as `int`s as well, so that the type of a time only depends on its value, not on the unit."""
+    if float(time).is_integer():
+        return int(time)
+    return time
+
+
+def output_units_to_ps(timestamp):
+    return timestamp if not config.TRACE_CONVERT_TO_CYCLES else cycles_to_ps(timestamp)
+
+
+def symbol(string):
+    """Intern `string` in the symbol table shared by all events and slices, so that equal call names, thread names and
+    thread uids are only allocated once"""
+    return sys.intern(string) if string is not None else None
+
+
 def thread_id_to_uid(thread_id, cpu_id):
-    return str(thread_id) if thread_id != 0 else f'swapper/{cpu_id}'
+    return symbol(str(thread_id) if thread_id != 0 else f'swapper/{cpu_id}')
 
 
 def thread_uid_to_id(thread_uid):